@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the encoder and the solver.
+
+Generates non-consecutive Sudoku puzzles of increasing size (SAT ones at
+several clue densities, plus UNSAT ones), runs every stage of the
+pipeline on each of them and writes the measurements to a JSON file.
+
+Usage:
+  python benchmark.py [--sizes 4 9 16 25 36] [--densities 0.3 0.5 0.7]
+                      [--count K] [--unsat K] [--engine dpll|cdcl]
+                      [--heuristic mom|dlcs|vsids] [--timeout SECONDS]
+                      [--out results.json]
+
+Per puzzle and per stage (to_cnf, write_dimacs, parse_dimacs, solve_cnf)
+the wall time and the peak traced memory (tracemalloc) are recorded, plus
+the solver's counters (see solver.SolverStats). Tracing slows every stage
+down by a roughly constant factor; pass --no-memory for plain timings.
+Compare two result files with the same sizes, seed and options.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import signal
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List
+
+import encoder
+from encoder import ENCODINGS, to_cnf
+from main_assignment1 import write_dimacs
+from main_assignment2 import parse_dimacs
+from solver import Solver
+
+# Format version of the JSON result file
+RESULTS_VERSION = 1
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", dest="sizes", type=int, nargs="+", default=[4, 9, 16, 25, 36])
+    p.add_argument("--densities", dest="densities", type=float, nargs="+", default=[0.3, 0.5, 0.7],
+                   help="Fractions of the cells given as clues")
+    p.add_argument("--count", dest="count", type=int, default=1, help="SAT puzzles per size and density")
+    p.add_argument("--unsat", dest="unsat", type=int, default=1, help="UNSAT puzzles per size")
+    p.add_argument("--seed", dest="seed", type=int, default=0)
+    p.add_argument("--engine", dest="engine", choices=["dpll", "cdcl"], default="cdcl")
+    p.add_argument("--heuristic", dest="heuristic", choices=["mom", "dlcs", "vsids"], default=None)
+    p.add_argument("--encoding", dest="encoding", choices=ENCODINGS, default="pairwise")
+    p.add_argument("--restarts", dest="restarts", choices=["none", "luby", "glucose"], default="luby")
+    p.add_argument("--timeout", dest="timeout", type=float, default=60.0, help="Time limit per solve in seconds")
+    p.add_argument("--no-memory", dest="memory", action="store_false", help="Do not trace peak memory")
+    p.add_argument("--puzzles", dest="puzzles", default=None, help="Also save the generated puzzles to this directory")
+    p.add_argument("--out", dest="out", default="benchmark.json", help="Path of the JSON results ('-' for stdout)")
+    return p.parse_args()
+
+
+# ---------------------------------------------------------------------------
+# Puzzle generation
+#
+# The shifted pattern (b*(r%b) + r//b + c) % N is a valid Sudoku for
+# N = b*b. Orthogonal neighbours in it have pattern values that differ by
+# 1, b or b+1 (mod N), so relabelling the values along an ordering of
+# 0..N-1 in which no two consecutive entries differ by one of those gives
+# a solution of the non-consecutive puzzle. Such an ordering does not
+# exist for N = 4, which has no solutions at all.
+# ---------------------------------------------------------------------------
+
+def non_consecutive_solution(N: int, rnd: random.Random) -> List[List[int]] | None:
+    """A random solved non-consecutive grid of size N, or None if none exists."""
+    b = math.isqrt(N)
+    forbidden = {d % N for s in (1, b, b + 1) for d in (s, -s)}
+    order = _relabelling(N, forbidden, rnd)
+    if order is None:
+        return None
+    value = [0] * N
+    for v, p in enumerate(order, 1):
+        value[p] = v
+    grid = [[value[(b * (r % b) + r // b + c) % N] for c in range(N)] for r in range(N)]
+    # The eight symmetries of the square and value reversal keep the grid a
+    # solution, and vary which pattern diagonal runs which way
+    if rnd.random() < 0.5:
+        grid = [list(row) for row in zip(*grid)]
+    for _ in range(rnd.randrange(4)):
+        grid = [list(row) for row in zip(*grid[::-1])]
+    if rnd.random() < 0.5:
+        grid = [[N + 1 - v for v in row] for row in grid]
+    return grid
+
+
+def _relabelling(N, forbidden, rnd):
+    """Randomised depth-first search for the ordering described above."""
+    start = rnd.randrange(N)
+    path = [start]
+    used = [False] * N
+    used[start] = True
+    stack = [_successors(start, N, forbidden, used, rnd)]
+    while stack:
+        if len(path) == N:
+            return path
+        nxt = next(stack[-1], None)
+        if nxt is None:
+            stack.pop()
+            used[path.pop()] = False
+            continue
+        path.append(nxt)
+        used[nxt] = True
+        stack.append(_successors(nxt, N, forbidden, used, rnd))
+    return None
+
+
+def _successors(p, N, forbidden, used, rnd):
+    options = [q for q in range(N) if not used[q] and (q - p) % N not in forbidden]
+    rnd.shuffle(options)
+    return iter(options)
+
+
+def make_puzzle(solution: List[List[int]], density: float, rnd: random.Random) -> List[List[int]]:
+    """Keep a random density fraction of the solution's cells as clues."""
+    N = len(solution)
+    cells = [(r, c) for r in range(N) for c in range(N)]
+    keep = set(rnd.sample(cells, round(density * N * N)))
+    return [[solution[r][c] if (r, c) in keep else 0 for c in range(N)] for r in range(N)]
+
+
+def make_unsat(N: int, density: float, rnd: random.Random) -> List[List[int]]:
+    """
+    A puzzle with no solution: the clues of a solvable one plus one clue
+    consecutive to an orthogonal neighbour. Every grid of size 4 is UNSAT,
+    so those just get clues from a plain Sudoku.
+    """
+    solution = non_consecutive_solution(N, rnd)
+    if solution is None:
+        b = math.isqrt(N)
+        solution = [[(b * (r % b) + r // b + c) % N + 1 for c in range(N)] for r in range(N)]
+        return make_puzzle(solution, density, rnd)
+    puzzle = make_puzzle(solution, density, rnd)
+    r, c = rnd.randrange(N), rnd.randrange(N - 1)
+    v = solution[r][c]
+    puzzle[r][c] = v
+    puzzle[r][c + 1] = v + 1 if v < N else v - 1
+    return puzzle
+
+
+def generate(sizes, densities, count, unsat, seed):
+    """Yield (name, puzzle, density, expected status) for the suite."""
+    rnd = random.Random(seed)
+    for N in sizes:
+        b = math.isqrt(N)
+        if b * b != N:
+            raise ValueError(f"Size {N} is not a perfect square")
+        for density in densities:
+            for k in range(count):
+                solution = non_consecutive_solution(N, rnd)
+                if solution is None:
+                    continue
+                yield f"n{N}_d{density:g}_{k}", make_puzzle(solution, density, rnd), density, "SAT"
+        for k in range(unsat):
+            density = densities[k % len(densities)]
+            yield f"n{N}_unsat_{k}", make_unsat(N, density, rnd), density, "UNSAT"
+
+
+def write_puzzle(path: str, puzzle: List[List[int]]) -> None:
+    with open(path, "w") as f:
+        for row in puzzle:
+            f.write(" ".join(map(str, row)) + "\n")
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+class SolveTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise SolveTimeout()
+
+
+def _measure(stages, name, memory, fn, *args):
+    """Run fn(*args), recording its wall time and peak memory under name."""
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        elapsed = time.perf_counter() - start
+        peak = None
+        if memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        stages[name] = {"time": round(elapsed, 6), "peak_bytes": peak}
+
+
+def _solve(clauses, num_vars, engine, heuristic, restarts, timeout):
+    # solve_cnf, keeping hold of the Solver for its counters
+    if heuristic is None:
+        heuristic = "mom" if engine == "dpll" else "vsids"
+    solver = Solver(clauses, num_vars, heuristic, restarts=None if restarts == "none" else restarts)
+    # The time limit only covers the search, so a timeout always has a Solver to report
+    if timeout:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        status, model = solver.solve(engine)
+    except SolveTimeout:
+        status = "TIMEOUT"
+    finally:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    return status, solver
+
+
+def run_one(puzzle_path, cnf_path, args) -> dict:
+    stages = {}
+    # Encode from scratch every time rather than from the skeleton cache
+    encoder.skeleton.cache_clear()
+    clauses, num_vars = _measure(stages, "to_cnf", args.memory, to_cnf, puzzle_path, args.encoding)
+    _measure(stages, "write_dimacs", args.memory, write_dimacs, cnf_path, num_vars, clauses)
+    clauses, num_vars = _measure(stages, "parse_dimacs", args.memory, parse_dimacs, cnf_path)
+
+    status, solver = _measure(stages, "solve_cnf", args.memory, _solve, clauses, num_vars,
+                              args.engine, args.heuristic, args.restarts, args.timeout)
+
+    return {
+        "num_vars": num_vars,
+        "num_clauses": len(clauses),
+        "status": status,
+        "stats": solver.stats.as_dict(),
+        "stages": stages,
+        "total_time": round(sum(s["time"] for s in stages.values()), 6),
+    }
+
+
+def main():
+    args = parse_args()
+    if args.puzzles:
+        os.makedirs(args.puzzles, exist_ok=True)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        cnf_path = os.path.join(tmp, "instance.cnf")
+        for name, puzzle, density, expected in generate(args.sizes, args.densities,
+                                                        args.count, args.unsat, args.seed):
+            puzzle_path = os.path.join(args.puzzles or tmp, name + ".txt")
+            write_puzzle(puzzle_path, puzzle)
+            entry = {
+                "name": name,
+                "N": len(puzzle),
+                "density": density,
+                "clues": sum(v != 0 for row in puzzle for v in row),
+                "expected": expected,
+            }
+            entry.update(run_one(puzzle_path, cnf_path, args))
+            if entry["status"] not in (expected, "TIMEOUT"):
+                print(f"{name}: expected {expected}, got {entry['status']}", file=sys.stderr)
+            print(f"{name} {entry['status']} {entry['total_time']:.3f}s", file=sys.stderr, flush=True)
+            results.append(entry)
+
+    report = {
+        "version": RESULTS_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": {
+            "sizes": args.sizes,
+            "densities": args.densities,
+            "count": args.count,
+            "unsat": args.unsat,
+            "seed": args.seed,
+            "engine": args.engine,
+            "heuristic": args.heuristic,
+            "encoding": args.encoding,
+            "restarts": args.restarts,
+            "timeout": args.timeout,
+            "memory": args.memory,
+        },
+        "results": results,
+    }
+    if args.out == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Canonical forms of non-consecutive Sudoku puzzles, and a solution store
+on disk keyed by them.
+
+The rules are kept by the eight symmetries of the square (rotations,
+transposition, flips: rows, columns and boxes map to rows, columns and
+boxes, and orthogonal neighbours stay neighbours) and by the value
+reversal v -> N+1-v (|a-b| = 1 exactly when |(N+1-a)-(N+1-b)| = 1).
+Other row and column permutations that keep the box bands split up
+orthogonal neighbours, so these 16 transformations are the whole group.
+
+A transformation is a number t in 0..15: t & 7 picks the symmetry of the
+square (SQUARE_SYMMETRIES, in that order) and t & 8 the value reversal.
+The canonical form of a puzzle is its smallest image (row-major, values
+compared in order) over all 16; solutions of the canonical puzzle map
+back to the original through inverse(t).
+"""
+
+import hashlib
+import sqlite3
+import sys
+from array import array
+from functools import lru_cache
+from typing import List, Tuple
+
+SQUARE_SYMMETRIES = ("identity", "rotate90", "rotate180", "rotate270",
+                     "transpose", "antitranspose", "mirror", "flip")
+# Index of the inverse of every symmetry of the square
+_SQUARE_INVERSE = (0, 3, 2, 1, 4, 5, 6, 7)
+
+
+@lru_cache(maxsize=None)
+def _gathers(N):
+    """Per symmetry of the square, the source cell of every cell of the image."""
+    m = N - 1
+    maps = (lambda r, c: (r, c), lambda r, c: (c, m - r),
+            lambda r, c: (m - r, m - c), lambda r, c: (m - c, r),
+            lambda r, c: (c, r), lambda r, c: (m - c, m - r),
+            lambda r, c: (r, m - c), lambda r, c: (m - r, c))
+    gathers = []
+    for f in maps:
+        source = [0] * (N * N)
+        for r in range(N):
+            for c in range(N):
+                rr, cc = f(r, c)
+                source[rr * N + cc] = r * N + c
+        gathers.append(tuple(source))
+    return tuple(gathers)
+
+
+def _apply(flat, N, t):
+    image = [flat[i] for i in _gathers(N)[t & 7]]
+    if t & 8:
+        image = [N + 1 - v if v else 0 for v in image]
+    return image
+
+
+def transform(grid: List[List[int]], t: int) -> List[List[int]]:
+    """The image of a grid (puzzle or solution, 0 = empty) under transformation t."""
+    N = len(grid)
+    image = _apply([v for row in grid for v in row], N, t)
+    return [image[r * N:(r + 1) * N] for r in range(N)]
+
+
+def inverse(t: int) -> int:
+    return _SQUARE_INVERSE[t & 7] | (t & 8)
+
+
+def canonical_form(puzzle: List[List[int]]) -> Tuple[List[List[int]], int]:
+    """(canonical puzzle, t) with transform(puzzle, t) the canonical puzzle."""
+    N = len(puzzle)
+    flat = [v for row in puzzle for v in row]
+    best, best_t = flat, 0
+    for t in range(1, 16):
+        image = _apply(flat, N, t)
+        if image < best:
+            best, best_t = image, t
+    return [best[r * N:(r + 1) * N] for r in range(N)], best_t
+
+
+def grid_key(grid: List[List[int]]) -> bytes:
+    """Hash of a grid's size and values, as a compact lookup key."""
+    values = array("H", [len(grid)])
+    for row in grid:
+        values.extend(row)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return hashlib.blake2b(b"grid" + values.tobytes(), digest_size=16).digest()
+
+
+class SolutionStore:
+    """
+    Solved puzzles in an SQLite file, one row per canonical puzzle with its
+    canonical solution (NULL for UNSAT). get() and put() take puzzles as
+    they come and do the mapping; load() and save() work on canonical keys
+    and grids directly. Several processes can share one file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.execute("CREATE TABLE IF NOT EXISTS solutions "
+                        "(key BLOB PRIMARY KEY, n INTEGER NOT NULL, solution BLOB)")
+        self.db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get(self, puzzle: List[List[int]]) -> Tuple[str, List[List[int]] | None] | None:
+        """(status, solution of puzzle) if an equivalent puzzle was stored, else None."""
+        canon, t = canonical_form(puzzle)
+        entry = self.load(grid_key(canon), len(puzzle))
+        if entry is None or entry[1] is None:
+            return entry
+        return entry[0], transform(entry[1], inverse(t))
+
+    def put(self, puzzle: List[List[int]], solution: List[List[int]] | None) -> None:
+        """Store the solution of puzzle (None if it has none)."""
+        canon, t = canonical_form(puzzle)
+        self.save(grid_key(canon), len(puzzle), transform(solution, t) if solution is not None else None)
+
+    def load(self, key: bytes, N: int) -> Tuple[str, List[List[int]] | None] | None:
+        row = self.db.execute("SELECT n, solution FROM solutions WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] != N:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if row[1] is None:
+            return "UNSAT", None
+        values = array("H")
+        values.frombytes(row[1])
+        if sys.byteorder == "big":
+            values.byteswap()
+        return "SAT", [values[r * N:(r + 1) * N].tolist() for r in range(N)]
+
+    def save(self, key: bytes, N: int, solution: List[List[int]] | None) -> None:
+        blob = None
+        if solution is not None:
+            values = array("H")
+            for row in solution:
+                values.extend(row)
+            if sys.byteorder == "big":
+                values.byteswap()
+            blob = values.tobytes()
+        self.db.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?, ?)", (key, N, blob))
+        self.db.commit()
@@ -0,0 +1,235 @@
+"""
+Flat clause storage shared by the encoder, the DIMACS I/O and the solver.
+
+A CNF is kept CSR-style: one int32 buffer with the literals of all clauses
+back to back, and an offsets buffer where clause i is
+lits[offsets[i]:offsets[i + 1]]. That is two Python objects for the whole
+formula instead of one list per clause and one int per literal.
+The solver keeps its own clause database in the same form, so a formula
+from the encoder or the DIMACS parser is loaded with a buffer copy.
+
+The binary file format (dump, load, map) is the two buffers, in the
+narrowest widths that hold them, behind a 32-byte header:
+
+    magic "FCNF", format version, codec, literal width, offset width
+    (uint8 each), num_vars, clause count, literal count (int64 each)
+
+then the literals (int16 below 2^15 variables, else int32), zero padding
+up to a multiple of the offset width and the clause count + 1 offsets
+(int32 below 2^31 literals, else int64), all little-endian. With a codec
+other than "none" everything after the header is one zlib, bz2 or lzma
+stream. Uncompressed files can be memory-mapped, so loading one costs no
+parsing and no copy; compressed ones are a fraction of the size and
+still load with one decompression and two buffer copies.
+"""
+
+import bz2
+import lzma
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+from itertools import repeat
+from operator import add
+from typing import BinaryIO, Iterable, Iterator, List
+
+MAGIC = b"FCNF"
+VERSION = 3
+_HEADER = struct.Struct("<4sBBBBqqq")
+# Bytes per value of the array typecodes used in files, and back
+_WIDTHS = {"h": 2, "i": 4, "q": 8}
+_CODES = {2: "h", 4: "i", 8: "q"}
+# Codecs by their number in the header
+CODECS = ("none", "zlib", "bz2", "lzma")
+_COMPRESSORS = {"zlib": lambda: zlib.compressobj(6), "bz2": bz2.BZ2Compressor,
+                "lzma": lzma.LZMACompressor}
+_DECOMPRESS = {"zlib": zlib.decompress, "bz2": bz2.decompress, "lzma": lzma.decompress}
+
+
+class FlatCNF:
+    """
+    CNF formula as a literal buffer plus clause offsets. The buffers are
+    arrays, except in formulas from map(), where they are read-only
+    memoryviews of the file (possibly of narrower types); copy() gives a
+    modifiable formula.
+    """
+
+    __slots__ = ("lits", "offsets", "num_vars")
+
+    def __init__(self, num_vars: int = 0, lits: array | None = None, offsets: array | None = None):
+        self.num_vars = num_vars
+        self.lits = lits if lits is not None else array("i")
+        self.offsets = offsets if offsets is not None else array("q", [0])
+
+    @classmethod
+    def from_clauses(cls, clauses: Iterable[Iterable[int]], num_vars: int) -> "FlatCNF":
+        cnf = cls(num_vars)
+        for clause in clauses:
+            cnf.append(clause)
+        return cnf
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __iter__(self) -> Iterator[array]:
+        lits = self.lits
+        offsets = self.offsets
+        for i in range(len(offsets) - 1):
+            yield lits[offsets[i]:offsets[i + 1]]
+
+    def __getitem__(self, i: int) -> array:
+        return self.lits[self.offsets[i]:self.offsets[i + 1]]
+
+    def append(self, clause: Iterable[int]) -> None:
+        self.lits.extend(clause)
+        self.offsets.append(len(self.lits))
+
+    def extend(self, other: "FlatCNF") -> None:
+        """Append every clause of another FlatCNF."""
+        shift = len(self.lits)
+        self.lits.extend(other.lits)
+        self.offsets.extend(map(add, other.offsets[1:], repeat(shift)))
+
+    def extend_uniform(self, lits: Iterable[int], width: int) -> None:
+        """Append a run of clauses that all have the same width."""
+        start = len(self.lits)
+        self.lits.extend(lits)
+        self.offsets.extend(range(start + width, len(self.lits) + 1, width))
+
+    def delete(self, indices: Iterable[int]) -> array:
+        """
+        Remove the clauses at the given indices in place. Returns the new
+        index of every old clause (-1 for removed ones). The remaining
+        clauses are moved in runs, one slice per gap.
+        """
+        lits = self.lits
+        offsets = self.offsets
+        count = len(self)
+        remap = array("i", [-1]) * count
+        new_lits = array("i")
+        new_offsets = array("q", [0])
+        prev = 0
+        for i in sorted(set(indices)) + [count]:
+            if prev < i:
+                first = len(new_offsets) - 1
+                shift = len(new_lits) - offsets[prev]
+                new_lits.extend(lits[offsets[prev]:offsets[i]])
+                new_offsets.extend(map(add, offsets[prev + 1:i + 1], repeat(shift)))
+                remap[prev:i] = array("i", range(first, first + i - prev))
+            prev = i + 1
+        self.lits = new_lits
+        self.offsets = new_offsets
+        return remap
+
+    def copy(self) -> "FlatCNF":
+        return FlatCNF(self.num_vars, _owned(self.lits, "i", True), _owned(self.offsets, "q", True))
+
+    def __reduce__(self):
+        # Mapped formulas are pickled (for worker processes) as arrays
+        return FlatCNF, (self.num_vars, _owned(self.lits, "i"), _owned(self.offsets, "q"))
+
+    def dump(self, f: BinaryIO, codec: str = "none") -> None:
+        """Write the formula to a binary file object, compressed with codec (see CODECS)."""
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec: {codec}")
+        lits = self.lits
+        num_lits = len(lits)
+        top = max(self.num_vars, max(lits), -min(lits)) if num_lits else self.num_vars
+        lit_code = "h" if top < 1 << 15 else "i"
+        offset_code = "i" if num_lits < 1 << 31 else "q"
+        f.write(_HEADER.pack(MAGIC, VERSION, CODECS.index(codec), _WIDTHS[lit_code],
+                             _WIDTHS[offset_code], self.num_vars, len(self), num_lits))
+        parts = [_little_endian(lits, lit_code),
+                 bytes(_padding(num_lits, lit_code, offset_code)),
+                 _little_endian(self.offsets, offset_code)]
+        if codec == "none":
+            for part in parts:
+                f.write(part)
+            return
+        compressor = _COMPRESSORS[codec]()
+        for part in parts:
+            f.write(compressor.compress(part))
+        f.write(compressor.flush())
+
+    @classmethod
+    def load(cls, f: BinaryIO) -> "FlatCNF":
+        """Read a formula written by dump(), into arrays."""
+        codec, layout, num_vars = _read_header(f.read(_HEADER.size))
+        body = f.read()
+        if codec != "none":
+            body = _DECOMPRESS[codec](body)
+        lits, offsets = _split(memoryview(body), *layout)
+        return cls(num_vars, _owned(lits, "i", True), _owned(offsets, "q", True))
+
+    @classmethod
+    def map(cls, path: str) -> "FlatCNF":
+        """
+        Memory-map a file written by dump(): the buffers are read-only views
+        of the file, of the widths stored in it, and only the pages that are
+        read are loaded. Compressed files (and any file on a big-endian
+        machine) are loaded instead.
+        """
+        with open(path, "rb") as f:
+            codec, layout, num_vars = _read_header(f.read(_HEADER.size))
+            if codec != "none" or sys.byteorder == "big":
+                f.seek(0)
+                return cls.load(f)
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # The views keep the mapping alive; it is unmapped with the last one
+        lits, offsets = _split(memoryview(data)[_HEADER.size:], *layout)
+        return cls(num_vars, lits, offsets)
+
+    def to_lists(self) -> List[List[int]]:
+        """The plain list-of-lists form, for callers that need one list per clause."""
+        return [clause.tolist() for clause in self]
+
+
+def _read_header(header):
+    """(codec, layout for _split, num_vars) from a dump() header."""
+    if len(header) < _HEADER.size:
+        raise ValueError("Not a binary CNF file")
+    magic, version, codec, lit_width, offset_width, num_vars, num_clauses, num_lits = _HEADER.unpack(header)
+    if (magic != MAGIC or version != VERSION or codec >= len(CODECS)
+            or lit_width not in (2, 4) or offset_width not in (4, 8)):
+        raise ValueError("Not a binary CNF file")
+    return CODECS[codec], (_CODES[lit_width], _CODES[offset_width], num_clauses, num_lits), num_vars
+
+
+def _padding(num_lits, lit_code, offset_code):
+    """Bytes between the literals and the aligned offsets."""
+    return -_WIDTHS[lit_code] * num_lits % _WIDTHS[offset_code]
+
+
+def _split(body, lit_code, offset_code, num_clauses, num_lits):
+    """The literal and offset views (of lit_code and offset_code) of a dump() body."""
+    size = _WIDTHS[lit_code] * num_lits
+    start = size + _padding(num_lits, lit_code, offset_code)
+    end = start + _WIDTHS[offset_code] * (num_clauses + 1)
+    if len(body) < end:
+        raise ValueError("Truncated binary CNF file")
+    return body[:size].cast(lit_code), body[start:end].cast(offset_code)
+
+
+def _owned(buf, typecode, copy=False):
+    """buf as an array of typecode: itself if it is one (unless copy), else a copy."""
+    if isinstance(buf, array) and buf.typecode == typecode and not copy:
+        return buf
+    if _typecode(buf) != typecode:
+        return array(typecode, buf)
+    owned = array(typecode)
+    owned.frombytes(memoryview(buf).cast("B"))
+    return owned
+
+
+def _typecode(buf):
+    return buf.typecode if isinstance(buf, array) else buf.format
+
+
+def _little_endian(buf, typecode):
+    """The bytes of buf as typecode values, in little-endian order."""
+    if _typecode(buf) != typecode or sys.byteorder == "big":
+        buf = _owned(buf, typecode, True)
+        if sys.byteorder == "big":
+            buf.byteswap()
+    return memoryview(buf).cast("B")
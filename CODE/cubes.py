@@ -0,0 +1,134 @@
+"""
+Cube-and-conquer: split one large CNF into many subproblems (cubes) and
+solve them in parallel.
+
+The cubes come from a lookahead on unit propagation. Starting from the
+empty cube, each cube is split on the shortest clause it leaves open: one
+child per free literal of that clause, with that literal true and the
+ones before it false, so the children cover the cube without overlapping.
+In the Sudoku encodings the shortest open clauses are the at-least-one
+clauses of the cells, so this splits on the empty cell with the fewest
+candidates left after propagating the clues. Cubes that propagation
+refutes are dropped on the spot, and splitting stops once there are
+enough cubes to keep every worker busy.
+
+Every worker process builds one Solver for the whole formula and solves
+its cubes as assumptions, so what it learns on one cube carries over to
+the next. The first SAT cube ends the run; the formula is UNSAT once every
+cube is, or as soon as one is refuted without its assumptions.
+"""
+
+import multiprocessing
+import os
+from collections import deque
+from typing import Iterable, List, Tuple
+
+from cnf import FlatCNF
+from solver import Solver, SolverStats
+
+# Cubes per worker, so that cubes of uneven difficulty still balance out
+CUBES_PER_WORKER = 8
+
+
+def make_cubes(clauses: Iterable[Iterable[int]], num_vars: int, count: int) -> List[List[int]]:
+    """
+    Split the formula into about count cubes (fewer if propagation settles
+    it first), each a list of literals. An empty list means every cube was
+    refuted, so the formula is UNSAT.
+    """
+    if not isinstance(clauses, FlatCNF):
+        clauses = FlatCNF.from_clauses(clauses, num_vars)
+    solver = Solver(clauses, num_vars)
+    long_clauses = [clause.tolist() for clause in clauses if len(clause) > 2]
+
+    pending = deque([[]])
+    leaves = []
+    while pending and len(pending) + len(leaves) < count:
+        cube = pending.popleft()
+        true = solver.implied(cube)
+        if true is None:
+            continue
+        free = _shortest_open(long_clauses, set(true))
+        if free is None:
+            leaves.append(cube)
+            continue
+        for k, lit in enumerate(free):
+            pending.append(cube + [-x for x in free[:k]] + [lit])
+    return leaves + list(pending)
+
+
+def _shortest_open(clauses, true):
+    """Unassigned literals of the shortest clause not satisfied by true, or None."""
+    best = None
+    for clause in clauses:
+        free = []
+        for lit in clause:
+            if lit in true:
+                break
+            if -lit not in true:
+                free.append(lit)
+        else:
+            # Propagation leaves open clauses at least two free literals
+            if best is None or len(free) < len(best):
+                best = free
+                if len(best) == 2:
+                    break
+    return best
+
+
+def solve_cubes(clauses: Iterable[Iterable[int]], num_vars: int,
+                workers: int | None = None, cubes: int | None = None,
+                heuristic: str = "vsids", restarts: str | None = "luby",
+                stats: SolverStats | None = None) -> Tuple[str, List[int] | None]:
+    """
+    Cube-and-conquer with workers processes (default: the number of cores)
+    and about cubes cubes (default: CUBES_PER_WORKER per worker), solved
+    with CDCL. Returns (status, model) as solve_cnf would; stats, if given,
+    adds up the counters of every cube solved.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if cubes is None:
+        cubes = workers * CUBES_PER_WORKER
+    if not isinstance(clauses, FlatCNF):
+        clauses = FlatCNF.from_clauses(clauses, num_vars)
+    split = make_cubes(clauses, num_vars, cubes)
+    if not split:
+        return "UNSAT", None
+
+    timed = stats is not None and stats.timed
+    pool = multiprocessing.Pool(min(workers, len(split)), _init_worker,
+                                (clauses, num_vars, heuristic, restarts, timed))
+    try:
+        for status, model, refuted, counters in pool.imap_unordered(_conquer, split):
+            if stats is not None:
+                stats.update(counters, add=True)
+            if status == "SAT":
+                return status, model
+            if refuted:
+                break
+        return "UNSAT", None
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+# ---------------------------------------------------------------------------
+# Worker side: one Solver per process, kept across the cubes it is sent.
+# ---------------------------------------------------------------------------
+
+_worker = {}
+
+
+def _init_worker(clauses, num_vars, heuristic, restarts, timed):
+    stats = SolverStats(timed=timed)
+    _worker["solver"] = Solver(clauses, num_vars, heuristic, stats, restarts)
+
+
+def _conquer(cube):
+    solver = _worker["solver"]
+    solver.stats.reset()
+    status, model = solver.solve("cdcl", cube)
+    # An empty core: the formula is UNSAT whatever the cube
+    refuted = status == "UNSAT" and not solver.core
+    return status, model, refuted, solver.stats.as_dict()
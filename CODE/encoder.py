@@ -19,131 +19,501 @@ You must encode:
 """
 
 
-from typing import Tuple, Iterable
+from typing import Tuple, Iterable, Iterator, List
+from array import array
+from functools import lru_cache
+from itertools import chain, repeat
+from operator import sub
 import math
+import os
 
-def to_cnf(input_path: str) -> Tuple[Iterable[Iterable[int]], int]:
+from cnf import FlatCNF
+
+# At-most-one encodings available for families (2)-(4)
+ENCODINGS = ("pairwise", "sequential", "commander", "product")
+
+def to_cnf(input_path: str, encoding: str = "pairwise") -> Tuple[Iterable[Iterable[int]], int]:
     """
     Read puzzle from input_path and return (clauses, num_vars).
 
     - clauses: iterable of iterables of ints (each clause), no trailing 0s
     - num_vars: must be N^3 with N = grid size
+
+    The clauses come back as a FlatCNF (one literal buffer plus clause
+    offsets), which write_dimacs and solve_cnf take as is; call
+    .to_lists() for the list-of-lists form.
+
+    encoding selects the at-most-one encoding of families (2)-(4). Every
+    encoding other than "pairwise" adds auxiliary variables numbered after
+    N^3, which num_vars then includes; var(r,c,v) is unchanged.
     """
 
-    with open(input_path, 'r') as f:
-        puzzle = [list(map(int, line.strip().split())) for line in f]
+    return puzzle_cnf(read_puzzle(input_path), encoding)
+
+def puzzle_cnf(puzzle: List[List[int]], encoding: str = "pairwise") -> Tuple[FlatCNF, int]:
+    """to_cnf for a puzzle already in memory (list of rows, 0 = empty)."""
+    N = len(puzzle)
+
+    clauses = skeleton(N, encoding).copy() # (1)-(5) only depend on N
+    clauses.extend(clues(puzzle, N))        # (6) Clues: unit clauses for the given puzzle
+
+    return clauses, clauses.num_vars
+
+# Grid sizes whose skeleton stays in memory
+SKELETON_CACHE_SIZE = 8
+
+# Directory for skeletons on disk (None: memory only). Read from the
+# environment so that batch worker processes pick it up too.
+_skeleton_store = os.environ.get("SUDOKU_SKELETON_STORE")
 
-    # print("Puzzle:", puzzle)
+def use_skeleton_store(directory: str | None) -> None:
+    """Also keep skeletons on disk in directory (None turns this off)."""
+    global _skeleton_store
+    _skeleton_store = directory
+    skeleton.cache_clear()
 
+@lru_cache(maxsize=SKELETON_CACHE_SIZE)
+def skeleton(N: int, encoding: str = "pairwise") -> FlatCNF:
+    """
+    Families (1)-(5) for grid size N, which do not depend on the clues.
+    Cached per N and encoding (least recently used ones are evicted) and,
+    when a store is set, saved to a binary file and memory-mapped from it. Callers
+    must not modify the result; to_cnf works on a copy.
+    """
+    aux, num_vars = _layout(N, encoding)
+    path = None
+    if _skeleton_store:
+        path = os.path.join(_skeleton_store, f"skeleton_n{N}_{encoding}.fcnf")
+        try:
+            return FlatCNF.map(path)
+        except (OSError, ValueError, EOFError):
+            pass
+
+    cnf = FlatCNF(num_vars)
+    for chunk in chain(_at_least_one(N), _exactly_one_in_col(N, encoding, aux[0]),
+                       _exactly_one_in_row(N, encoding, aux[1]),
+                       _exactly_one_in_box(N, encoding, aux[2]), _non_consecutive(N)):
+        cnf.extend(chunk)
+
+    if path:
+        os.makedirs(_skeleton_store, exist_ok=True)
+        # Write under a temporary name first: other processes may be reading
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            cnf.dump(f)
+        os.replace(tmp, path)
+    return cnf
+
+def stream_cnf(input_path: str, encoding: str = "pairwise") -> Tuple[Iterator[FlatCNF], int, int]:
+    """
+    Like to_cnf, but return (chunks, num_vars, num_clauses) where chunks
+    lazily yields the clauses one constraint group at a time, so the whole
+    formula is never held in memory.
+    """
+    puzzle = read_puzzle(input_path)
     N = len(puzzle)
-    num_vars = N * N * N
+    return iter_cnf(puzzle, encoding), _layout(N, encoding)[1], count_clauses(puzzle, encoding)
 
-    clauses = []
-    clauses += at_least_one(N)       # (1) At least one value per cell
-    clauses += exactly_one_in_col(N) # (2) For each value v and each row r: exactly one column c has v
-    clauses += exactly_one_in_row(N) # (3) For each value v and each column c: exactly one row r has v
-    clauses += exactly_one_in_box(N) # (4) For each value v and each sqrt(N)×sqrt(N) box: exactly one cell has v
-    clauses += non_consecutive(N)    # (5) Non-consecutive: orthogonal neighbors cannot differ by 1
-    clauses += clues(puzzle, N)      # (6) Clues: unit clauses for the given puzzle
-  
-    #print("Clauses after (6):", len(clauses))
-    # print("Clauses: ", clauses)
+def iter_cnf(puzzle, encoding: str = "pairwise") -> Iterator[FlatCNF]:
+    """Yield the clauses of families (1)-(6) in order, as FlatCNF chunks."""
+    N = len(puzzle)
+    aux, num_vars = _layout(N, encoding)
+    return chain(
+        _at_least_one(N),                         # (1) At least one value per cell
+        _exactly_one_in_col(N, encoding, aux[0]), # (2) For each value v and each row r: exactly one column c has v
+        _exactly_one_in_row(N, encoding, aux[1]), # (3) For each value v and each column c: exactly one row r has v
+        _exactly_one_in_box(N, encoding, aux[2]), # (4) For each value v and each sqrt(N)×sqrt(N) box: exactly one cell has v
+        _non_consecutive(N),                      # (5) Non-consecutive: orthogonal neighbors cannot differ by 1
+        _clues(puzzle, N),                        # (6) Clues: unit clauses for the given puzzle
+    )
+
+def count_clauses(puzzle, encoding: str = "pairwise") -> int:
+    """Number of clauses iter_cnf yields, in closed form."""
+    N = len(puzzle)
+    b = math.isqrt(N)
+    line = len(_amo_template(encoding, N)[0]) // 2   # N*(N-1)/2 for pairwise
+    box = len(_amo_template(encoding, b * b)[0]) // 2
+    return (N * N                               # (1)
+            + 2 * N * N * line                  # (2), (3)
+            + N * b * b * box                   # (4)
+            + 8 * N * (N - 1) * (N - 1)         # (5)
+            + sum(v != 0 for row in puzzle for v in row))  # (6)
 
-    return clauses, num_vars
+def read_puzzle(input_path: str) -> List[List[int]]:
+    with open(input_path, 'r') as f:
+        return [list(map(int, line.split())) for line in f if line.strip()]
 
 # Helper function to map (r,c,v) to variable number
 def var(r: int, c: int, v: int, N: int) -> int:
     return r * N * N + c * N + v
 
-# (1) At least one value per cell
-def at_least_one(N):
-    clauses = []
+def _join(chunks):
+    cnf = FlatCNF()
+    for chunk in chunks:
+        cnf.extend(chunk)
+    return cnf
 
-    for x in range(N):
-        for y in range(N):
-            clause = []
-            for v in range(1, N + 1):
-                clause.append(var(x, y, v, N))
-            clauses.append(clause)
+# The families below never call var() per literal. Each one is a fixed
+# pattern of offsets relative to a group base (e.g. var(r, 0, v) for a row),
+# so a whole group is emitted with one map() over the pattern:
+# -(base + offset) == sub(-base, offset).
+# The _family(N) generators yield one FlatCNF per group; the public
+# family(N) functions join them.
 
-    return clauses
+def _negated(base, pattern):
+    return map(sub, repeat(-base, len(pattern)), pattern)
 
-# (2) For each value v and each row r: exactly one column c has v
-def exactly_one_in_col(N):
-    clauses = []
+def _pairs(members):
+    # Interleaved offsets of every pair a < b, in the pairwise AMO order
+    pattern = []
+    for a in range(len(members) - 1):
+        for b in range(a + 1, len(members)):
+            pattern += (members[a], members[b])
+    return pattern
+
+def _pairwise(bases, members):
+    pattern = _pairs(members)
+    for base in bases:
+        chunk = FlatCNF()
+        chunk.extend_uniform(_negated(base, pattern), 2)
+        yield chunk
 
+# Groups of at most this many members always use pairwise clauses
+SMALL_AMO = 4
+
+@lru_cache(maxsize=None)
+def _amo_template(encoding, m):
+    """
+    At-most-one over local members 1..m in the given encoding, as a flat
+    list of binary clauses over signed local ids. Auxiliary variables get
+    ids m+1, m+2, ...; returns (clauses, number of auxiliary variables).
+
+    - sequential: Sinz's counter, s_i means "one of x_1..x_i is true"
+    - commander: groups of 3 with a commander each (x -> c), AMO inside the
+      group, and the commanders constrained recursively
+    - product: members on a p x q grid, x -> row_i and x -> col_j, and
+      at-most-one recursively over the rows and over the columns
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown encoding: {encoding}")
+    lits = []
+    next_id = [m + 1]
+
+    def aux():
+        next_id[0] += 1
+        return next_id[0] - 1
+
+    def amo(xs, enc):
+        if enc == "pairwise" or len(xs) <= SMALL_AMO:
+            for a in range(len(xs) - 1):
+                for b in range(a + 1, len(xs)):
+                    lits.extend((-xs[a], -xs[b]))
+        elif enc == "sequential":
+            s = [aux() for _ in range(len(xs) - 1)]
+            lits.extend((-xs[0], s[0]))
+            for i in range(1, len(xs) - 1):
+                lits.extend((-xs[i], s[i], -s[i - 1], s[i], -xs[i], -s[i - 1]))
+            lits.extend((-xs[-1], -s[-1]))
+        elif enc == "commander":
+            commanders = []
+            for k in range(0, len(xs), 3):
+                group = xs[k:k + 3]
+                amo(group, "pairwise")
+                c = aux()
+                commanders.append(c)
+                for x in group:
+                    lits.extend((-x, c))
+            amo(commanders, "commander")
+        elif enc == "product":
+            p = math.isqrt(len(xs) - 1) + 1
+            q = -(-len(xs) // p)
+            rows = [aux() for _ in range(p)]
+            cols = [aux() for _ in range(q)]
+            for k, x in enumerate(xs):
+                i, j = divmod(k, q)
+                lits.extend((-x, rows[i], -x, cols[j]))
+            amo(rows, "product")
+            amo(cols, "product")
+
+    amo(list(range(1, m + 1)), encoding)
+    return lits, next_id[0] - m - 1
+
+def _layout(N, encoding):
+    """First auxiliary variable of families (2), (3), (4), and num_vars."""
+    b = math.isqrt(N)
+    start = N * N * N + 1
+    starts = []
+    for groups, m in ((N * N, N), (N * N, N), (N * b * b, b * b)):
+        starts.append(start)
+        start += groups * _amo_template(encoding, m)[1]
+    return starts, start - 1
+
+def _amo(bases, members, encoding, aux):
+    """One at-most-one per group base; auxiliary variables from aux on."""
+    if encoding == "pairwise":
+        yield from _pairwise(bases, members)
+        return
+    template, width = _amo_template(encoding, len(members))
+    for base in bases:
+        ids = [base + offset for offset in members]
+        ids.extend(range(aux, aux + width))
+        aux += width
+        # Local id -> variable, with negative ids at the negative indices
+        table = [0] + ids + [-x for x in reversed(ids)]
+        chunk = FlatCNF()
+        chunk.extend_uniform(map(table.__getitem__, template), 2)
+        yield chunk
+
+# (1) At least one value per cell
+def _at_least_one(N):
+    # Cell (x, y) is var(x, y, 1) ... var(x, y, N): one run of N per cell
     for x in range(N):
-        for z in range(1, N + 1):
-            for y in range(N-1):
-                for i in range(y+1, N):
-                    clauses.append([-var(x, y, z, N), -var(x, i, z, N)])    
+        chunk = FlatCNF()
+        chunk.extend_uniform(range(x * N * N + 1, (x + 1) * N * N + 1), N)
+        yield chunk
 
-    return clauses
+def at_least_one(N):
+    return _join(_at_least_one(N))
 
-# (3) For each value v and each column c: exactly one row r has v
-def exactly_one_in_row(N):
-    clauses = []
+# (2) For each value v and each row r: exactly one column c has v
+def _exactly_one_in_col(N, encoding="pairwise", aux=0):
+    bases = (x * N * N + z for x in range(N) for z in range(1, N + 1))
+    return _amo(bases, [y * N for y in range(N)], encoding, aux)
 
-    for y in range(N):
-        for z in range(1, N + 1):
-            for x in range(N-1):
-                for i in range(x+1, N):
-                    clauses.append([-var(x, y, z, N), -var(i, y, z, N)])    
+def exactly_one_in_col(N, encoding="pairwise"):
+    return _join(_exactly_one_in_col(N, encoding, _layout(N, encoding)[0][0]))
 
-    return clauses
+# (3) For each value v and each column c: exactly one row r has v
+def _exactly_one_in_row(N, encoding="pairwise", aux=0):
+    bases = (y * N + z for y in range(N) for z in range(1, N + 1))
+    return _amo(bases, [x * N * N for x in range(N)], encoding, aux)
+
+def exactly_one_in_row(N, encoding="pairwise"):
+    return _join(_exactly_one_in_row(N, encoding, _layout(N, encoding)[0][1]))
 
 # (4) For each value v and each sqrt(N)×sqrt(N) box: exactly one cell has v
-def exactly_one_in_box(N):
-    clauses = []
+def _exactly_one_in_box(N, encoding="pairwise", aux=0):
     b = math.isqrt(N)
-    
-    for z in range(1, N+1):
-        for i in range(0, b):
-            for j in range(0, b):
-                for x in range(0, b):
-                    for y in range(0, b):
-                        for k in range(y+1, b):
-                            clause = [-var(b*i+x, b*j+y, z, N), -var(b*i+x, b*j+k, z, N)]
-                            clauses.append(clause)
-                        for k in range(x+1, b):
-                            for l in range(0, b):
-                                clause = [-var(b*i+x, b*j+y, z, N), -var(b*i+k, b*j+l, z, N)]
-                                clauses.append(clause)
-
-    return clauses
+    bases = (b * i * N * N + b * j * N + z
+             for z in range(1, N + 1) for i in range(b) for j in range(b))
+    return _amo(bases, [x * N * N + y * N for x in range(b) for y in range(b)], encoding, aux)
+
+def exactly_one_in_box(N, encoding="pairwise"):
+    return _join(_exactly_one_in_box(N, encoding, _layout(N, encoding)[0][2]))
 
 # (5) Non-consecutive: orthogonal neighbors cannot differ by 1
-def non_consecutive(N):
-    clauses = []
+def _non_consecutive(N):
+    def towards(step, order):
+        pattern = []
+        for v in range(1, N + 1):
+            for d in order:
+                if 1 <= v + d <= N:
+                    pattern += (v, step + v + d)
+        return pattern
+
+    up, down = towards(-N * N, (1, -1)), towards(N * N, (1, -1))
+    left, right = towards(-N, (-1, 1)), towards(N, (-1, 1))
 
     for x in range(N):
+        chunk = FlatCNF()
         for y in range(N):
-            for dx in [-1, 1]:
-                if 0 <= x + dx < N:
-                    for v in range(1, N + 1):
-                        if v + 1 <= N:
-                            clauses.append([-var(x, y, v, N), -var(x + dx, y, v + 1, N)])
-                        if v - 1 >= 1:
-                            clauses.append([-var(x, y, v, N), -var(x + dx, y, v - 1, N)])
-            for dy in [-1, 1]:
-                if 0 <= y + dy < N:
-                    for v in range(1, N + 1):
-                        if v - 1 >= 1:
-                            clauses.append([-var(x, y, v, N), -var(x, y + dy, v - 1, N)])
-                        if v + 1 <= N:
-                            clauses.append([-var(x, y, v, N), -var(x, y + dy, v + 1, N)])
-
-    return clauses
+            pattern = []
+            if x > 0:
+                pattern += up
+            if x < N - 1:
+                pattern += down
+            if y > 0:
+                pattern += left
+            if y < N - 1:
+                pattern += right
+            chunk.extend_uniform(_negated(x * N * N + y * N, pattern), 2)
+        yield chunk
+
+def non_consecutive(N):
+    return _join(_non_consecutive(N))
 
 # (6) Clues: unit clauses for the given puzzle
+def _clues(puzzle, N):
+    chunk = FlatCNF()
+    chunk.extend_uniform((var(r, c, puzzle[r][c], N)
+                          for r in range(N) for c in range(N) if puzzle[r][c] != 0), 1)
+    yield chunk
+
 def clues(puzzle, N):
-    clauses = []
+    return _join(_clues(puzzle, N))
 
+# Clue-driven simplification
+#
+# A clue fixes its cell, removes its value from every row, column and box
+# peer and removes v-1 and v+1 from its orthogonal neighbours. Cells left
+# with a single candidate are treated as clues in turn. The clauses are
+# then generated only over the remaining free variables: every clause the
+# plain encoding has that contains a fixed variable is either satisfied or
+# reduces to one of these.
+
+class Reduction:
+    """
+    Link between a simplified CNF and var(r,c,v): var_map[i] is the
+    original variable of simplified variable i, and value[var] is 1 for
+    variables fixed true, -1 for eliminated ones and 0 for free ones.
+    """
+
+    __slots__ = ("N", "var_map", "value")
+
+    def __init__(self, N, var_map, value):
+        self.N = N
+        self.var_map = var_map
+        self.value = value
+
+    def original_model(self, model: Iterable[int]) -> List[int]:
+        """Complete DIMACS model over var(r,c,v) for a model of the simplified CNF."""
+        value = list(self.value)
+        var_map = self.var_map
+        for lit in model:
+            v = abs(lit)
+            # Only free variables take their value from the model
+            if v < len(var_map) and self.value[var_map[v]] == 0:
+                value[var_map[v]] = 1 if lit > 0 else -1
+        return sorted(v if value[v] > 0 else -v for v in range(1, len(value)))
+
+def to_simplified_cnf(input_path: str, renumber: bool = True) -> Tuple[FlatCNF, int, Reduction]:
+    """
+    Read puzzle from input_path and return (clauses, num_vars, reduction)
+    for the formula left after clue propagation. With renumber the free
+    variables are numbered 1..num_vars densely; otherwise var(r,c,v) is
+    kept and num_vars stays N^3. An inconsistent puzzle gives one empty
+    clause.
+    """
+    puzzle = read_puzzle(input_path)
+    N = len(puzzle)
+    cand = candidates(puzzle)
+
+    value = [0] * (N * N * N + 1)
+    for cell in range(N * N):
+        mask = cand[cell] if cand is not None else 0
+        single = mask & (mask - 1) == 0
+        for v in range(1, N + 1):
+            if mask >> (v - 1) & 1:
+                value[cell * N + v] = 1 if single else 0
+            else:
+                value[cell * N + v] = -1
+
+    if renumber:
+        var_map = array("i", [0])
+        var_map.extend(v for v in range(1, len(value)) if value[v] == 0)
+    else:
+        var_map = array("i", range(len(value)))
+    num_vars = len(var_map) - 1
+    reduction = Reduction(N, var_map, value)
+
+    clauses = FlatCNF(num_vars)
+    if cand is None:
+        clauses.append(())
+        return clauses, num_vars, reduction
+
+    # Literal -> simplified literal, using negative indices for negations
+    table = [0] * (2 * len(value) - 1)
+    for new, old in enumerate(var_map):
+        table[old] = new
+        table[-old] = -new
+
+    for chunk in _simplified(N, value):
+        lits = array("i", map(table.__getitem__, chunk.lits))
+        clauses.extend(FlatCNF(num_vars, lits, chunk.offsets))
+
+    return clauses, num_vars, reduction
+
+def candidates(puzzle) -> List[int] | None:
+    """
+    Candidate bitmask per cell (bit v-1 for value v, cells in row-major
+    order) after propagating the clues, or None if they contradict.
+    """
+    N = len(puzzle)
+    b = math.isqrt(N)
+    full = (1 << N) - 1
+    cand = [full] * (N * N)
+
+    queue = []
     for r in range(N):
         for c in range(N):
             v = puzzle[r][c]
             if v != 0:
-                clause = var(r, c, v, N)
-                clauses.append([clause])
+                bit = 1 << (v - 1)
+                if not cand[r * N + c] & bit:
+                    return None
+                cand[r * N + c] = bit
+                queue.append(r * N + c)
+
+    done = [False] * (N * N)
+    while queue:
+        cell = queue.pop()
+        if done[cell]:
+            continue
+        done[cell] = True
+        bit = cand[cell]
+        r, c = divmod(cell, N)
+        br, bc = r - r % b, c - c % b
+        peers = {r * N + k for k in range(N)} | {k * N + c for k in range(N)}
+        # Family (4) only has the b x b boxes at the top left (all of them if N = b*b)
+        if b and br < b * b and bc < b * b:
+            peers |= {(br + i) * N + bc + j for i in range(b) for j in range(b)}
+        peers.discard(cell)
+        removals = [(peer, bit) for peer in peers]
+        # v-1 and v+1 are bits next to bit
+        near = ((bit << 1) | (bit >> 1)) & full
+        for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+            if 0 <= nr < N and 0 <= nc < N:
+                removals.append((nr * N + nc, near))
+        for peer, mask in removals:
+            if cand[peer] & mask:
+                cand[peer] &= ~mask
+                left = cand[peer]
+                if left == 0:
+                    return None
+                if left & (left - 1) == 0:
+                    queue.append(peer)
+    return cand
+
+def _simplified(N, value):
+    """Yield the clauses over free variables (original numbering) as chunks."""
+    b = math.isqrt(N)
 
-    return clauses
\ No newline at end of file
+    def free(cells, v):
+        return [cell * N + v for cell in cells if value[cell * N + v] == 0]
+
+    def pairwise(groups):
+        chunk = FlatCNF()
+        for members in groups:
+            chunk.extend_uniform((-x for x in _pairs(members)), 2)
+        return chunk
+
+    # (1) At least one value per cell
+    chunk = FlatCNF()
+    for cell in range(N * N):
+        lits = [cell * N + v for v in range(1, N + 1) if value[cell * N + v] == 0]
+        if lits:
+            chunk.append(lits)
+    yield chunk
+
+    rows = [[r * N + c for c in range(N)] for r in range(N)]
+    cols = [[r * N + c for r in range(N)] for c in range(N)]
+    boxes = [[(b * i + x) * N + b * j + y for x in range(b) for y in range(b)]
+             for i in range(b) for j in range(b)]
+    yield pairwise(free(row, v) for row in rows for v in range(1, N + 1))  # (2)
+    yield pairwise(free(col, v) for col in cols for v in range(1, N + 1))  # (3)
+    yield pairwise(free(box, v) for v in range(1, N + 1) for box in boxes) # (4)
+
+    # (5) Non-consecutive, once per unordered pair of neighbours
+    chunk = FlatCNF()
+    for cell in range(N * N):
+        r, c = divmod(cell, N)
+        for other in ((cell + N) if r < N - 1 else None, (cell + 1) if c < N - 1 else None):
+            if other is None:
+                continue
+            for v in range(1, N + 1):
+                if value[cell * N + v] != 0:
+                    continue
+                for w in (v - 1, v + 1):
+                    if 1 <= w <= N and value[other * N + w] == 0:
+                        chunk.extend_uniform((-(cell * N + v), -(other * N + w)), 2)
+    yield chunk
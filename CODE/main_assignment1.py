@@ -6,15 +6,35 @@ Do NOT modify this file - instead, implement your function in encoder.py
 
 Usage:
   python main.py --in <puzzle.txt> --out <instance.cnf>
+  python main.py --in <puzzle.txt> --out <instance.fcnf> --format binary [--compress zlib|bz2|lzma]
 """
 
 import argparse
 import sys
-from encoder import to_cnf  #implement
+from array import array
+from bisect import bisect_right
+from encoder import ENCODINGS, stream_cnf  #implement
+from cnf import CODECS, FlatCNF
 
+# Characters of formatted clauses collected before each write
+WRITE_BUFFER = 1 << 20
+# Literals of a FlatCNF formatted at a time, so that a whole formula is
+# never held as one string
+FORMAT_LITS = 1 << 17
 
-def write_dimacs(target, num_vars: int, clauses) -> None:
-    """Write DIMACS CNF to a file path or file-like (stdout)."""
+
+def write_dimacs(target, num_vars: int, clauses, num_clauses: int | None = None) -> None:
+    """
+    Write DIMACS CNF to a file path or file-like (stdout).
+
+    clauses is an iterable of clauses, a FlatCNF, or an iterable of FlatCNF
+    chunks (as produced by encoder.stream_cnf); it is consumed once and
+    written in large buffered blocks. The header count is num_clauses if
+    given, counted up front if clauses is a FlatCNF or a sized collection,
+    and otherwise the header is
+    back-patched once everything has been written (or, for unseekable
+    targets such as a pipe, the clauses are collected first).
+    """
     close = False
     if isinstance(target, str):
         f = open(target, "w")
@@ -22,30 +42,130 @@ def write_dimacs(target, num_vars: int, clauses) -> None:
     else:
         f = target
     try:
-        clauses = list(clauses)
-        f.write(f"p cnf {num_vars} {len(clauses)}\n")
-        for cl in clauses:
-            f.write(" ".join(str(l) for l in cl) + " 0\n")
+        if isinstance(clauses, FlatCNF):
+            if num_clauses is None:
+                num_clauses = len(clauses)
+            clauses = (clauses,)
+        elif num_clauses is None and hasattr(clauses, "__len__"):
+            num_clauses = sum(len(c) if isinstance(c, FlatCNF) else 1 for c in clauses)
+
+        patch_at = None
+        if num_clauses is None:
+            if f.seekable():
+                patch_at = f.tell()
+                # Room for any count; DIMACS readers split on whitespace
+                f.write(f"p cnf {num_vars} {'':<20}\n")
+            else:
+                clauses = list(clauses)
+                num_clauses = sum(len(c) if isinstance(c, FlatCNF) else 1 for c in clauses)
+        if patch_at is None:
+            f.write(f"p cnf {num_vars} {num_clauses}\n")
+
+        written = 0
+        buffered = 0
+        parts = []
+        for item in clauses:
+            if isinstance(item, FlatCNF):
+                pieces = (_format_chunk(item, start, stop) for start, stop in _ranges(item))
+                written += len(item)
+            else:
+                pieces = (" ".join(map(str, item)) + " 0\n",)
+                written += 1
+            for text in pieces:
+                parts.append(text)
+                buffered += len(text)
+                if buffered >= WRITE_BUFFER:
+                    f.write("".join(parts))
+                    parts = []
+                    buffered = 0
+        f.write("".join(parts))
+
+        if patch_at is not None:
+            end = f.tell()
+            f.seek(patch_at)
+            f.write(f"p cnf {num_vars} {written:<20}")
+            f.seek(end)
     finally:
         if close:
             f.close()
 
 
+def write_binary(target, num_vars: int, clauses, codec: str = "none") -> None:
+    """
+    Write the binary CNF format of cnf.FlatCNF.dump to a file path or a
+    binary file-like (stdout's buffer). clauses is taken as write_dimacs
+    takes it and gathered into one FlatCNF first.
+    """
+    if isinstance(clauses, FlatCNF):
+        # A view with this header, leaving the caller's formula as it is
+        clauses = FlatCNF(num_vars, clauses.lits, clauses.offsets)
+    else:
+        cnf = FlatCNF(num_vars)
+        for item in clauses:
+            if isinstance(item, FlatCNF):
+                cnf.extend(item)
+            else:
+                cnf.append(item)
+        clauses = cnf
+    if isinstance(target, str):
+        with open(target, "wb") as f:
+            clauses.dump(f, codec)
+    else:
+        clauses.dump(target, codec)
+        target.flush()
+
+
+def _ranges(chunk: FlatCNF):
+    """Clause ranges (start, stop) of chunk with up to FORMAT_LITS literals (or one clause) each."""
+    offsets = chunk.offsets
+    count = len(offsets) - 1
+    start = 0
+    while start < count:
+        stop = bisect_right(offsets, offsets[start] + FORMAT_LITS, start + 1, count + 1) - 1
+        stop = max(stop, start + 1)
+        yield start, stop
+        start = stop
+
+
+def _format_chunk(chunk: FlatCNF, start: int, stop: int) -> str:
+    """DIMACS text of clauses start..stop-1 of chunk."""
+    lits = chunk.lits
+    offsets = chunk.offsets
+    count = stop - start
+    first, last = offsets[start], offsets[stop]
+    width = offsets[start + 1] - first
+    if width and offsets[start:stop + 1] == array("q", range(first, last + 1, width)):
+        # Every clause has the same width: one %-format for the whole range
+        return (("%d " * width + "0\n") * count) % tuple(lits[first:last])
+    return "".join(" ".join(map(str, lits[offsets[i]:offsets[i + 1]])) + " 0\n"
+                   for i in range(start, stop))
+
+
 def parse_args():
     p = argparse.ArgumentParser()
     p.add_argument("--in", dest="inp", required=True, help="Path to puzzle .txt")
-    p.add_argument("--out", dest="out", default=None, help="Path to write DIMACS CNF (stdout if omitted)")
+    p.add_argument("--out", dest="out", default=None, help="Path to write the CNF (stdout if omitted)")
+    p.add_argument("--format", dest="format", choices=("dimacs", "binary"), default="dimacs",
+                   help="DIMACS text, or the binary format that main_assignment2 --sat memory-maps")
+    p.add_argument("--compress", dest="compress", choices=CODECS[1:], default=None,
+                   help="Compress the binary format (it is then loaded instead of mapped)")
+    p.add_argument("--encoding", dest="encoding", choices=ENCODINGS, default="pairwise",
+                   help="At-most-one encoding for the row, column and box constraints")
     return p.parse_args()
 
 
 def main():
     args = parse_args()
-    clauses, num_vars = to_cnf(args.inp)
+    if args.compress and args.format != "binary":
+        sys.exit("--compress needs --format binary")
+    chunks, num_vars, num_clauses = stream_cnf(args.inp, args.encoding)
 
-    if args.out:
-        write_dimacs(args.out, num_vars, clauses)
+    if args.format == "binary":
+        write_binary(args.out or sys.stdout.buffer, num_vars, chunks, args.compress or "none")
+    elif args.out:
+        write_dimacs(args.out, num_vars, chunks, num_clauses)
     else:
-        write_dimacs(sys.stdout, num_vars, clauses)
+        write_dimacs(sys.stdout, num_vars, chunks, num_clauses)
 
 
 if __name__ == "__main__":
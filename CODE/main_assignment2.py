@@ -6,6 +6,17 @@ Do NOT modify this file - instead, implement your function in encoder.py
 
 Usage:
   python main.py --in <puzzle.txt>
+  python main.py --batch <dir | glob | manifest> [--workers K] [--timeout SECONDS]
+  python main.py --sat <instance.cnf | instance.fcnf>
+  Add --stats to print solver counters and phase timings to stderr.
+  Add --backend native to solve puzzles directly instead of through CNF.
+  Add --portfolio K to race K solver configurations on one input.
+  Add --divide K to split one input into cubes solved on K processes.
+  Add --preprocess to simplify the CNF (probing, equivalent literals,
+  subsumption, variable elimination) before search.
+  Add --store <file.db> to keep solutions on disk by the puzzle's canonical
+  form (see canonical.py): puzzles equivalent to a stored one are answered
+  without encoding or solving.
 
 Behavior:
   - Reads a Sudoku puzzle in plain text format (N x N grid, 0 = empty).
@@ -14,29 +25,114 @@ Behavior:
         SAT
      or
         UNSAT
+  - In batch mode, solves every puzzle on a process pool and prints one
+    "<path> SAT|UNSAT|TIMEOUT|ERROR" line per puzzle, in input order.
 """
 
 import argparse
+import glob
+import mmap
+import os
+import re
+import signal
+import sys
 import time
+from concurrent.futures import ProcessPoolExecutor
+from array import array
+from itertools import compress, count
+from operator import not_, sub
 from typing import Tuple, Iterable
-from encoder import to_cnf
-from solver import solve_cnf
+from encoder import ENCODINGS, read_puzzle, to_cnf, to_simplified_cnf
+from solver import SolverStats, solve_cnf
+from sudoku_solver import solve_sudoku_file
+from cubes import solve_cubes
+from canonical import SolutionStore
+from decoder import decode
+from cnf import MAGIC, FlatCNF
 
 def parse_args():
     p = argparse.ArgumentParser()
-    p.add_argument("--in", dest="inp", required=True)
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--in", dest="inp")
+    src.add_argument("--batch", dest="batch", help="Directory, glob pattern or manifest file of inputs")
     p.add_argument("--sat", dest="sat", action='store_true')
-    return p.parse_args()
+    p.add_argument("--engine", dest="engine", choices=["dpll", "cdcl"], default="dpll")
+    p.add_argument("--restarts", dest="restarts", choices=["none", "luby", "glucose"], default="luby",
+                   help="CDCL restart policy")
+    p.add_argument("--backend", dest="backend", choices=["cnf", "native"], default="cnf",
+                   help="Solve through CNF, or with the direct bitmask solver (puzzle inputs only)")
+    p.add_argument("--simplify", dest="simplify", action='store_true', help="Propagate the clues at encode time")
+    p.add_argument("--preprocess", dest="preprocess", action='store_true',
+                   help="Simplify the CNF once before search")
+    p.add_argument("--encoding", dest="encoding", choices=ENCODINGS, default="pairwise",
+                   help="At-most-one encoding for the row, column and box constraints")
+    p.add_argument("--store", dest="store", default=None,
+                   help="SQLite file of solutions by canonical puzzle (puzzle inputs only)")
+    p.add_argument("--stats", dest="stats", action='store_true', help="Print solver statistics to stderr")
+    p.add_argument("--portfolio", dest="portfolio", type=int, default=None,
+                   help="Race this many solver configurations in parallel on a single input")
+    p.add_argument("--divide", dest="divide", type=int, default=None,
+                   help="Cube-and-conquer a single input on this many processes")
+    p.add_argument("--workers", dest="workers", type=int, default=None, help="Batch worker processes (default: all cores)")
+    p.add_argument("--timeout", dest="timeout", type=float, default=None, help="Per-input time limit in seconds for batch mode")
+    args = p.parse_args()
+    if args.backend == "native" and args.sat:
+        p.error("--backend native needs puzzle inputs, not --sat")
+    if args.store and args.sat:
+        p.error("--store needs puzzle inputs, not --sat")
+    for flag, value in (("--portfolio", args.portfolio), ("--divide", args.divide)):
+        if value is not None and (args.batch or args.backend == "native"):
+            p.error(f"{flag} applies to a single input solved through CNF")
+    if args.simplify and args.encoding != "pairwise":
+        p.error("--simplify builds its own pairwise encoding; it cannot be combined with --encoding")
+    if args.portfolio is not None and args.divide is not None:
+        p.error("--portfolio and --divide cannot be combined")
+    if args.preprocess and (args.backend == "native" or args.divide is not None):
+        p.error("--preprocess applies to solving through solve_cnf")
+    if args.restarts == "none":
+        args.restarts = None
+    return args
 
 def main():
 
     args = parse_args()
 
+    if args.batch:
+      run_batch(args)
+      return
+
+    stats = SolverStats(timed=True) if args.stats else None
+
+    store = None
+    if args.store:
+      store = SolutionStore(args.store)
+      puzzle = read_puzzle(args.inp)
+      cached = store.get(puzzle)
+      if cached is not None:
+        print(cached[0])
+        return
+
+    if args.backend == "native":
+      status, model = solve_sudoku_file(args.inp, stats)
+      if stats is not None:
+        print(stats.summary(), file=sys.stderr)
+      if store is not None:
+        store_result(store, puzzle, model)
+      print(status)
+      return
+
+    reduction = None
     if(args.sat):
-      clauses, num_vars = parse_dimacs(args.inp)
-    
+      try:
+        clauses, num_vars = read_cnf(args.inp)
+      except ValueError as e:
+        sys.exit(str(e))
+
+    elif args.simplify:
+      clauses, num_vars, reduction = to_simplified_cnf(args.inp)
+
     else:
-      clauses, num_vars = to_cnf(args.inp)
+      clauses, num_vars = to_cnf(args.inp, args.encoding)
 
     # clauses, num_vars = parse_dimacs("/Users/richard/Documents/MSc Artificial Inteligence /assignments/knowledge representation/SAT Project Assignment 1 - Files/EXAMPLE puzzles (input)/slides_example.cnf")
     #clauses, num_vars = to_cnf("/Users/richard/Documents/MSc Artificial Inteligence /assignments/knowledge representation/SAT Project Assignment 1 - Files/EXAMPLE puzzles (input)/example_n16.txt")
@@ -45,7 +141,15 @@ def main():
     # get the start time
     # st = time.time()
 
-    status, model = solve_cnf(clauses, num_vars)
+    if args.divide is not None:
+        status, model = solve_cubes(clauses, num_vars, args.divide, restarts=args.restarts, stats=stats)
+    else:
+        status, model = solve_cnf(clauses, num_vars, args.engine, stats=stats, restarts=args.restarts,
+                                  workers=args.portfolio, preprocess=args.preprocess)
+    if stats is not None:
+        print(stats.summary(), file=sys.stderr)
+    if store is not None:
+        store_result(store, puzzle, model, reduction)
 
     # et = time.time()
 
@@ -64,41 +168,183 @@ def main():
     # print(string_model.strip())
 
 
-def parse_dimacs(input_path: str) -> Tuple[Iterable[Iterable[int]], int]:
-    close = False
-    if isinstance(input_path, str):
-        file = open(input_path, "r")
-        close = True
-    else:
-        file = input_path
-
-
-    line = file.readline()
-
-    components = line.strip().split(" ")
+def store_result(store: SolutionStore, puzzle, model, reduction=None) -> None:
+    """Save the result of solving puzzle: the model from solve_cnf, None if UNSAT."""
+    if model is not None and reduction is not None:
+        model = reduction.original_model(model)
+    store.put(puzzle, decode(model, len(puzzle)) if model is not None else None)
+
+
+class PuzzleTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise PuzzleTimeout()
+
+
+def batch_inputs(source: str) -> list:
+    """
+    Expand a batch source into input paths: every file of a directory
+    (sorted), the sorted matches of a glob pattern, or the non-blank,
+    non-# lines of a manifest file, relative to the manifest's directory.
+    """
+    if os.path.isdir(source):
+        return sorted(os.path.join(source, name) for name in os.listdir(source)
+                      if not name.startswith(".") and os.path.isfile(os.path.join(source, name)))
+    if glob.has_magic(source):
+        return sorted(glob.glob(source))
+    base = os.path.dirname(source)
+    with open(source, "r") as manifest:
+        return [os.path.join(base, line.strip()) for line in manifest
+                if line.strip() and not line.lstrip().startswith("#")]
+
+
+def solve_file(path: str, sat: bool = False, engine: str = "dpll",
+               timeout: float | None = None, simplify: bool = False,
+               encoding: str = "pairwise", stats: bool = False,
+               backend: str = "cnf", restarts: str | None = "luby",
+               preprocess: bool = False, store: str | None = None) -> str:
+    """Encode (or parse) and solve one input; returns its status line word."""
+    if timeout:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    solutions = None
+    try:
+        solver_stats = SolverStats(timed=True) if stats else None
+        reduction = None
+        if store:
+            solutions = SolutionStore(store)
+            puzzle = read_puzzle(path)
+            cached = solutions.get(puzzle)
+            if cached is not None:
+                return cached[0]
+        if backend == "native":
+            status, model = solve_sudoku_file(path, solver_stats)
+        else:
+            if sat:
+                clauses, num_vars = read_cnf(path)
+            elif simplify:
+                clauses, num_vars, reduction = to_simplified_cnf(path)
+            else:
+                clauses, num_vars = to_cnf(path, encoding)
+            status, model = solve_cnf(clauses, num_vars, engine, stats=solver_stats, restarts=restarts,
+                                      preprocess=preprocess)
+        if solver_stats is not None:
+            print(f"{path}:\n{solver_stats.summary()}", file=sys.stderr, flush=True)
+        if solutions is not None:
+            store_result(solutions, puzzle, model, reduction)
+    except PuzzleTimeout:
+        status = "TIMEOUT"
+    except (Exception, SystemExit) as e:
+        # SystemExit too: one input must not end the whole batch
+        print(f"{path}: {e!r}", file=sys.stderr)
+        status = "ERROR"
+    finally:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        if solutions is not None:
+            solutions.close()
+    return status
+
+
+def run_batch(args) -> None:
+    paths = batch_inputs(args.batch)
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(solve_file, path, args.sat, args.engine, args.timeout,
+                               args.simplify, args.encoding, args.stats,
+                               args.backend, args.restarts, args.preprocess, args.store)
+                   for path in paths]
+        # Results are printed in input order as soon as each one is ready
+        for path, future in zip(paths, futures):
+            try:
+                status = future.result()
+            except Exception as e:
+                # e.g. BrokenProcessPool: report the input instead of aborting
+                print(f"{path}: {e!r}", file=sys.stderr)
+                status = "ERROR"
+            print(f"{path} {status}", flush=True)
+
+
+# Comment lines, and everything after a SATLIB-style "%" end marker
+_COMMENT = re.compile(rb"^[ \t]*c.*$", re.M)
+_END = re.compile(rb"^[ \t]*%", re.M)
+_HEADER = re.compile(rb"^[ \t]*p[ \t]+cnf[ \t]+(\d+)[ \t]+(\d+)[ \t\r]*$", re.M)
+
+
+def read_cnf(input_path: str) -> Tuple[FlatCNF, int]:
+    """
+    (clauses, num_vars) from a --sat input: files in the binary format of
+    main_assignment1 --format binary are memory-mapped (or decompressed),
+    anything else is parsed as DIMACS.
+    """
+    with open(input_path, "rb") as file:
+        binary = file.read(len(MAGIC)) == MAGIC
+    if binary:
+        clauses = FlatCNF.map(input_path)
+        return clauses, clauses.num_vars
+    return parse_dimacs(input_path)
 
-    if len(components)!= 4 or components[0]!="p" or components[1]!="cnf":
-      print("Wrong file format! Expected first line to be 'p cnf NUM_VARS NUM_CLAUSES")
-      exit(1)
 
-    num_vars=int(components[2])
-    num_clauses=int(components[3])
-
-    clauses=[]
-
-    line=file.readline()
-    while(line):
-       numbers = [int(x) for x in line.strip().split(" ")]
-
-       if(numbers[-1]!=0):
-          print("Wrong format! Clause lines must be terminated with a 0")
-
-       clauses.append(numbers[:-1])
-
-       line=file.readline()
-
-
-    return clauses, num_vars
+def parse_dimacs(input_path: str) -> Tuple[Iterable[Iterable[int]], int]:
+    """
+    Read a DIMACS CNF from a file path or file-like object and return
+    (clauses, num_vars), with the clauses as a FlatCNF.
+
+    Files are memory-mapped and tokenized in one pass: "c" comment lines
+    are dropped, literals may be separated by any whitespace and clauses
+    may span lines, since only the 0 terminators delimit them. Raises
+    ValueError if there is no "p cnf" header before the clauses.
+    """
+    if isinstance(input_path, str):
+        with open(input_path, "rb") as file:
+            try:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                data = b""  # Empty files cannot be mapped
+            try:
+                return _parse_dimacs_bytes(data)
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+    data = input_path.read()
+    if isinstance(data, str):
+        data = data.encode()
+    return _parse_dimacs_bytes(data)
+
+
+def _parse_dimacs_bytes(data) -> Tuple[FlatCNF, int]:
+    header = _HEADER.search(data)
+    if header is None or _COMMENT.sub(b"", data[:header.start()]).strip():
+      raise ValueError("Wrong file format! Expected first line to be 'p cnf NUM_VARS NUM_CLAUSES'")
+
+    body = data[header.end():]
+    # Literals never contain these bytes, so the regexes only run when needed
+    if body.find(b"%") != -1:
+        end = _END.search(body)
+        if end:
+            body = body[:end.start()]
+    if body.find(b"c") != -1:
+        body = _COMMENT.sub(b"", body)
+
+    num_vars = int(header.group(1))
+
+    # Everything below stays in C loops. A CNF has at most 2*num_vars + 1
+    # distinct tokens, so each is converted with int() once and then looked
+    # up; the 0 terminators are located and dropped with compress/filter.
+    tokens = body.split()
+    table = {token: int(token) for token in set(tokens)}
+    ints = list(map(table.__getitem__, tokens))
+    ends = list(compress(count(), map(not_, ints)))
+    lits = array("i", list(filter(None, ints)))
+    offsets = array("q", [0])
+    offsets.fromlist(list(map(sub, ends, count())))
+
+    if len(lits) > offsets[-1]:
+       print("Wrong format! Clause lines must be terminated with a 0", file=sys.stderr)
+       offsets.append(len(lits))
+
+    return FlatCNF(num_vars, lits, offsets), num_vars
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,156 @@
+"""
+Parallel portfolio solving: several differently configured solvers race on
+the same CNF in a process pool, and the first answer wins.
+
+Which branching heuristic, restart policy or phase is fast on a given
+puzzle is hard to tell up front, and runtimes differ by orders of
+magnitude, so on a multi-core machine it pays to run a few of them at
+once. Every configuration is a dict with the solve engine and Solver
+keyword arguments, e.g.
+
+    {"engine": "cdcl", "heuristic": "vsids", "restarts": "glucose",
+     "phase": "random", "seed": 3}
+
+The workers can share short learnt clauses: every learnt clause of at most
+share literals is sent to the other workers that restart (CDCL with a
+restart policy), which add what they received at their next restart. An
+inbox holds at most INBOX_SIZE clauses; what does not fit is dropped. The
+losers are terminated as soon as one worker answers.
+"""
+
+import multiprocessing
+import os
+import queue
+from typing import Iterable, List, Tuple
+
+from cnf import FlatCNF
+from solver import Solver, SolverStats
+
+# Shared clauses waiting per worker; exports to a full inbox are dropped
+INBOX_SIZE = 10000
+
+# Diverse first: the configurations a portfolio of size k starts with
+CONFIGS = (
+    {"engine": "cdcl", "heuristic": "vsids", "restarts": "luby", "phase": "true"},
+    {"engine": "cdcl", "heuristic": "vsids", "restarts": "glucose", "phase": "false", "seed": 1},
+    {"engine": "dpll", "heuristic": "mom"},
+    {"engine": "cdcl", "heuristic": "vsids", "restarts": "luby", "phase": "random", "seed": 2},
+    {"engine": "cdcl", "heuristic": "dlcs", "restarts": "luby"},
+    {"engine": "cdcl", "heuristic": "vsids", "restarts": None, "phase": "false", "seed": 3},
+    {"engine": "dpll", "heuristic": "dlcs"},
+    {"engine": "cdcl", "heuristic": "vsids", "restarts": "glucose", "phase": "random", "seed": 4},
+)
+
+
+def portfolio(size: int) -> List[dict]:
+    """The first size configurations of CONFIGS, then VSIDS ones with fresh seeds."""
+    configs = [dict(config) for config in CONFIGS[:size]]
+    for k in range(len(configs), size):
+        configs.append({"engine": "cdcl", "heuristic": "vsids",
+                        "restarts": ("luby", "glucose")[k % 2], "phase": "random", "seed": k})
+    return configs
+
+
+def solve_portfolio(clauses: Iterable[Iterable[int]], num_vars: int,
+                    configs: List[dict] | None = None, workers: int | None = None,
+                    share: int = 2, stats: SolverStats | None = None) -> Tuple[str, List[int] | None]:
+    """
+    Race configs (default: portfolio(workers)) with one process each and
+    return the first (status, model), as solve_cnf would. workers defaults
+    to the number of cores. share is the longest learnt clause passed
+    between workers (0 to share nothing). stats, if given, receives the
+    counters (and times, if timed) of the winning run.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if configs is None:
+        configs = portfolio(workers)
+    if not configs:
+        raise ValueError("Empty portfolio")
+    if not isinstance(clauses, FlatCNF):
+        clauses = FlatCNF.from_clauses(clauses, num_vars)
+    timed = stats is not None and stats.timed
+
+    # Only workers that restart read their inbox; the others get none
+    inboxes = [multiprocessing.Queue(INBOX_SIZE) if _imports(config) else None
+               for config in configs] if share > 0 else None
+    pool = multiprocessing.Pool(len(configs), _init_worker,
+                                (clauses, num_vars, configs, inboxes, share, timed))
+    try:
+        results = pool.imap_unordered(_race, range(len(configs)))
+        error = None
+        for _ in configs:
+            try:
+                status, model, counters = next(results)
+            except Exception as e:
+                # A broken configuration does not stop the others
+                error = e
+                continue
+            if stats is not None:
+                stats.update(counters)
+            return status, model
+        raise error
+    finally:
+        pool.terminate()
+        pool.join()
+        for inbox in inboxes or ():
+            if inbox is not None:
+                inbox.close()
+                inbox.cancel_join_thread()
+
+
+def _imports(config):
+    """Whether a configuration takes in shared clauses (at CDCL restarts)."""
+    return config.get("engine", "cdcl") == "cdcl" and config.get("restarts") is not None
+
+
+# ---------------------------------------------------------------------------
+# Worker side. The pool initializer leaves the formula and the queues in
+# module globals, so each task only sends its configuration index.
+# ---------------------------------------------------------------------------
+
+_worker = {}
+
+
+def _init_worker(clauses, num_vars, configs, inboxes, share, timed):
+    _worker.update(clauses=clauses, num_vars=num_vars, configs=configs,
+                   inboxes=inboxes, share=share, timed=timed)
+
+
+def _race(index):
+    config = dict(_worker["configs"][index])
+    engine = config.pop("engine", "cdcl")
+    stats = SolverStats(timed=_worker["timed"])
+    solver = Solver(_worker["clauses"], _worker["num_vars"], stats=stats, **config)
+
+    inboxes = _worker["inboxes"]
+    if inboxes is not None:
+        share = _worker["share"]
+        inbox = inboxes[index]
+        outboxes = [box for k, box in enumerate(inboxes) if k != index and box is not None]
+
+        def export(clause):
+            if len(clause) <= share:
+                clause = list(clause)
+                for box in outboxes:
+                    try:
+                        box.put_nowait(clause)
+                    except queue.Full:
+                        pass
+
+        def receive():
+            clauses = []
+            try:
+                while True:
+                    clauses.append(inbox.get_nowait())
+            except queue.Empty:
+                pass
+            return clauses
+
+        if outboxes:
+            stats.on_learn = export
+        if inbox is not None:
+            solver.import_clauses = receive
+
+    status, model = solver.solve(engine)
+    return status, model, stats.as_dict()
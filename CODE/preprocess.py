@@ -0,0 +1,450 @@
+"""
+CNF preprocessing: simplify a formula once before search, and turn models
+of the simplified formula back into models of the original one.
+
+The pipeline, in order:
+
+  probing       every variable of a binary clause is propagated both ways
+                (Solver.implied). A polarity that runs into a conflict is a
+                failed literal, so its negation holds; literals implied by
+                both polarities hold as well. The units found are applied
+                to the clauses, which drops satisfied clauses and false
+                literals.
+  equivalences  the binary clauses form an implication graph (a or b gives
+                -a -> b and -b -> a). The literals of a strongly connected
+                component are equivalent and are replaced by one of them;
+                a component with both x and -x means UNSAT.
+  subsumption   clauses that contain a smaller clause are dropped, and a
+                clause D with C - {l} in D - {-l} loses -l (self-subsuming
+                resolution).
+  elimination   a variable is eliminated by resolution (its clauses are
+                replaced by all non-tautological resolvents on it) when that
+                does not add clauses (bounded variable elimination).
+
+Units found along the way are propagated at once. The simplified formula
+keeps the variable numbering, so eliminated and substituted variables
+simply no longer occur in it.
+
+Models are reconstructed from an extension stack: every clause taken out of
+the formula in a way that does not preserve equivalence is pushed with a
+witness literal of it (the unit itself, the replaced literal, or the
+eliminated variable). Going through the stack backwards, every clause not
+satisfied by the model so far has its witness flipped to true; that makes
+the model satisfy the original formula.
+
+The Sudoku encodings are mostly binary clauses: once the clues are
+propagated, a cell with two candidates a and b left has a or b and -a or
+-b, so a = -b; and a candidate whose placement empties a peer cell is a
+failed literal.
+"""
+
+import time
+from typing import Iterable, List, Tuple
+
+from cnf import FlatCNF
+from solver import Solver
+
+# Elimination is only tried on variables with at most this many
+# occurrence pairs, and gives up on resolvents longer than this
+ELIM_PAIRS = 1024
+RESOLVENT_LIMIT = 20
+
+
+class Preprocessor:
+    """
+    One preprocessing run over a formula. run() returns the simplified
+    FlatCNF (one empty clause if the formula was refuted) and extend()
+    maps its models back. The counters report what each step did.
+    """
+
+    COUNTERS = ("fixed", "failed", "equivalent", "subsumed", "strengthened", "eliminated")
+
+    def __init__(self, clauses: Iterable[Iterable[int]], num_vars: int):
+        if not isinstance(clauses, FlatCNF):
+            clauses = FlatCNF.from_clauses(clauses, num_vars)
+        self.cnf = clauses
+        # Literals above the header count widen the tables, as Solver._grow does
+        lits = clauses.lits
+        if lits:
+            num_vars = max(num_vars, max(lits), -min(lits))
+        self.num_vars = num_vars
+        # Clause database: removed clauses become None. Literal-indexed
+        # tables use negative indices for negations, as in the Solver.
+        self.clauses = []
+        self.sigs = []
+        self.occurs = [set() for _ in range(2 * num_vars + 1)]
+        self.val = [0] * (2 * num_vars + 1)
+        self.units = []
+        self.ok = True
+        # (witness, clause) pairs, in the order they were taken out
+        self.stack = []
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.time = 0.0
+
+    def run(self, probe: bool = True, equivalences: bool = True,
+            subsume: bool = True, eliminate: bool = True) -> FlatCNF:
+        start = time.perf_counter()
+        try:
+            top = self._probe() if probe else Solver(self.cnf, self.num_vars).implied()
+            if top is None:
+                self.ok = False
+            else:
+                self._load(top)
+            if self.ok and equivalences:
+                self._substitute()
+            if self.ok and subsume:
+                self._subsume()
+            if self.ok and eliminate:
+                self._eliminate()
+        finally:
+            self.time += time.perf_counter() - start
+        result = FlatCNF(self.num_vars)
+        if not self.ok:
+            result.append(())
+            return result
+        for clause in self.clauses:
+            if clause is not None:
+                result.append(clause)
+        return result
+
+    def extend(self, model: Iterable[int]) -> List[int]:
+        """Complete DIMACS model of the original formula for a model of the simplified one."""
+        # Variables the model leaves out start false
+        n = self.num_vars
+        val = [-1] * (n + 1) + [1] * n
+        for lit in model:
+            if abs(lit) <= n:
+                val[lit] = 1
+                val[-lit] = -1
+        for witness, clause in reversed(self.stack):
+            if not any(val[lit] == 1 for lit in clause):
+                val[witness] = 1
+                val[-witness] = -1
+        return [var if val[var] == 1 else -var for var in range(1, n + 1)]
+
+    def summary(self) -> str:
+        lines = [f"{name:<16}{getattr(self, name)}" for name in self.COUNTERS]
+        lines.append(f"{'preprocess time':<16}{self.time:.3f}s")
+        return "\n".join(lines)
+
+    # -----------------------------------------------------------------------
+    # Probing, on a Solver over the whole formula
+    # -----------------------------------------------------------------------
+
+    def _probe(self):
+        """Level-0 literals after failed-literal probing, or None if refuted."""
+        cnf = self.cnf
+        solver = Solver(cnf, self.num_vars)
+        if solver.implied() is None:
+            return None
+        offsets = cnf.offsets
+        lits = cnf.lits
+        candidates = set()
+        for i in range(len(cnf)):
+            if offsets[i + 1] - offsets[i] == 2:
+                candidates.add(abs(lits[offsets[i]]))
+                candidates.add(abs(lits[offsets[i] + 1]))
+
+        val = solver.val
+        for var in sorted(candidates):
+            if val[var] != 0:
+                continue
+            fixed = len(solver.trail)
+            pos = solver.implied([var])
+            neg = solver.implied([-var]) if pos is not None else None
+            if pos is None or neg is None:
+                self.failed += 1
+                lifted = [-var if pos is None else var]
+            else:
+                lifted = set(pos[fixed:]).intersection(neg[fixed:])
+            for lit in lifted:
+                if not solver.add_clause([lit]):
+                    return None
+        return solver.implied()
+
+    # -----------------------------------------------------------------------
+    # Clause database
+    # -----------------------------------------------------------------------
+
+    def _load(self, top):
+        for lit in top:
+            self._fix(lit)
+        for clause in self.cnf:
+            self._add(clause)
+        self._propagate()
+
+    def _add(self, clause):
+        """Add a clause, dropping false and repeated literals. False once UNSAT."""
+        val = self.val
+        lits = []
+        for lit in clause:
+            if val[lit] == 1 or -lit in lits:
+                return self.ok
+            if val[lit] == 0 and lit not in lits:
+                lits.append(lit)
+        if not lits:
+            self.ok = False
+        elif len(lits) == 1:
+            self._fix(lits[0])
+        else:
+            i = len(self.clauses)
+            self.clauses.append(lits)
+            self.sigs.append(_signature(lits))
+            for lit in lits:
+                self.occurs[lit].add(i)
+        return self.ok
+
+    def _remove(self, i):
+        for lit in self.clauses[i]:
+            self.occurs[lit].discard(i)
+        self.clauses[i] = None
+
+    def _strengthen(self, i, lit):
+        """Drop lit from clause i; a clause left with one literal becomes a unit."""
+        clause = self.clauses[i]
+        clause.remove(lit)
+        self.occurs[lit].discard(i)
+        if len(clause) == 1:
+            self._remove(i)
+            self._fix(clause[0])
+        else:
+            self.sigs[i] = _signature(clause)
+
+    def _fix(self, lit):
+        val = self.val
+        if val[lit] == 1:
+            return
+        if val[lit] == -1:
+            self.ok = False
+            return
+        val[lit] = 1
+        val[-lit] = -1
+        self.stack.append((lit, (lit,)))
+        self.units.append(lit)
+        self.fixed += 1
+
+    def _propagate(self):
+        """Apply the pending units to the clauses."""
+        units = self.units
+        while units and self.ok:
+            lit = units.pop()
+            for i in list(self.occurs[lit]):
+                self._remove(i)
+            for i in list(self.occurs[-lit]):
+                if self.clauses[i] is not None:
+                    self._strengthen(i, -lit)
+        return self.ok
+
+    # -----------------------------------------------------------------------
+    # Equivalent literal substitution
+    # -----------------------------------------------------------------------
+
+    def _substitute(self):
+        rep = self._components()
+        if rep is None:
+            self.ok = False
+            return
+        if not rep:
+            return
+        affected = set()
+        for lit, r in rep.items():
+            if lit > 0:
+                # lit = r, as the two clauses (lit or -r) and (-lit or r)
+                self.stack.append((lit, (lit, -r)))
+                self.stack.append((-lit, (-lit, r)))
+                self.equivalent += 1
+            affected |= self.occurs[lit]
+        for i in sorted(affected):
+            clause = self.clauses[i]
+            self._remove(i)
+            if not self._add([rep.get(lit, lit) for lit in clause]):
+                return
+        self._propagate()
+
+    def _components(self):
+        """
+        Literal -> representative for every literal in a strongly connected
+        component of the implication graph other than its representative
+        (the literal of the smallest variable), or None if x and -x are
+        in one component. Iterative Tarjan.
+        """
+        n = self.num_vars
+        succ = [[] for _ in range(2 * n + 1)]
+        for clause in self.clauses:
+            if clause is not None and len(clause) == 2:
+                a, b = clause
+                succ[-a].append(b)
+                succ[-b].append(a)
+
+        index = [0] * (2 * n + 1)  # Visit order from 1; 0 = not visited
+        low = [0] * (2 * n + 1)
+        on_stack = bytearray(2 * n + 1)
+        stack = []
+        rep = {}
+        counter = 0
+        for root in range(-n, n + 1):
+            if root == 0 or index[root] or not succ[root]:
+                continue
+            counter += 1
+            index[root] = low[root] = counter
+            stack.append(root)
+            on_stack[root] = 1
+            work = [(root, iter(succ[root]))]
+            while work:
+                lit, edges = work[-1]
+                for nxt in edges:
+                    if not index[nxt]:
+                        counter += 1
+                        index[nxt] = low[nxt] = counter
+                        stack.append(nxt)
+                        on_stack[nxt] = 1
+                        work.append((nxt, iter(succ[nxt])))
+                        break
+                    if on_stack[nxt] and index[nxt] < low[lit]:
+                        low[lit] = index[nxt]
+                else:
+                    work.pop()
+                    if work and low[lit] < low[work[-1][0]]:
+                        low[work[-1][0]] = low[lit]
+                    if low[lit] == index[lit]:
+                        component = []
+                        while True:
+                            x = stack.pop()
+                            on_stack[x] = 0
+                            component.append(x)
+                            if x == lit:
+                                break
+                        if len(component) > 1:
+                            best = min(component, key=abs)
+                            if -best in component:
+                                return None
+                            for x in component:
+                                if x != best:
+                                    rep[x] = best
+        return rep
+
+    # -----------------------------------------------------------------------
+    # Subsumption and self-subsuming resolution
+    # -----------------------------------------------------------------------
+
+    def _subsume(self):
+        clauses = self.clauses
+        occurs = self.occurs
+        sigs = self.sigs
+        queue = sorted((i for i, clause in enumerate(clauses) if clause is not None),
+                       key=lambda i: len(clauses[i]))
+        for i in queue:
+            if not self.ok:
+                return
+            c = clauses[i]
+            if c is None:
+                continue
+            # Every target contains the variable with the fewest occurrences
+            best = min(c, key=lambda lit: len(occurs[lit]) + len(occurs[-lit]))
+            sig = sigs[i]
+            for j in list(occurs[best]) + list(occurs[-best]):
+                d = clauses[j]
+                if j == i or d is None or len(d) < len(c) or sig & ~sigs[j]:
+                    continue
+                flip = _subsumes(c, d)
+                if flip is None:
+                    continue
+                if flip == 0:
+                    self._remove(j)
+                    self.subsumed += 1
+                else:
+                    self._strengthen(j, -flip)
+                    self.strengthened += 1
+                    if clauses[j] is not None:
+                        queue.append(j)
+                if clauses[i] is None:
+                    break
+            self._propagate()
+
+    # -----------------------------------------------------------------------
+    # Bounded variable elimination
+    # -----------------------------------------------------------------------
+
+    def _eliminate(self):
+        occurs = self.occurs
+        val = self.val
+        order = sorted(range(1, self.num_vars + 1),
+                       key=lambda var: len(occurs[var]) * len(occurs[-var]))
+        for var in order:
+            if not self.ok:
+                return
+            if val[var] != 0 or len(occurs[var]) * len(occurs[-var]) > ELIM_PAIRS:
+                continue
+            pos = [self.clauses[i] for i in occurs[var]]
+            neg = [self.clauses[i] for i in occurs[-var]]
+            if not pos and not neg:
+                continue
+            resolvents = self._resolvents(var, pos, neg)
+            if resolvents is None:
+                continue
+            for i in list(occurs[var]):
+                self.stack.append((var, tuple(self.clauses[i])))
+                self._remove(i)
+            for i in list(occurs[-var]):
+                self.stack.append((-var, tuple(self.clauses[i])))
+                self._remove(i)
+            self.eliminated += 1
+            for resolvent in resolvents:
+                if not self._add(resolvent):
+                    return
+            self._propagate()
+
+    def _resolvents(self, var, pos, neg):
+        """The resolvents on var, or None if there are more than the clauses they replace."""
+        limit = len(pos) + len(neg)
+        resolvents = []
+        for p in pos:
+            for n in neg:
+                resolvent = [lit for lit in p if lit != var]
+                for lit in n:
+                    if lit == -var or lit in resolvent:
+                        continue
+                    if -lit in resolvent:
+                        break
+                    resolvent.append(lit)
+                else:
+                    if len(resolvents) == limit or len(resolvent) > RESOLVENT_LIMIT:
+                        return None
+                    resolvents.append(resolvent)
+        return resolvents
+
+
+def _signature(clause):
+    """Bit set of the variables (mod 64): C can only subsume D if sig(C) is within sig(D)."""
+    sig = 0
+    for lit in clause:
+        sig |= 1 << (abs(lit) & 63)
+    return sig
+
+
+def _subsumes(c, d):
+    """
+    0 if clause c subsumes d, lit if c with lit negated does (so -lit can
+    be dropped from d), None otherwise.
+    """
+    flip = 0
+    for lit in c:
+        if lit in d:
+            continue
+        if not flip and -lit in d:
+            flip = lit
+            continue
+        return None
+    return flip
+
+
+def preprocess(clauses: Iterable[Iterable[int]], num_vars: int,
+               **steps) -> Tuple[FlatCNF, Preprocessor]:
+    """
+    Run the pipeline (steps switch probe, equivalences, subsume or
+    eliminate off) and return (simplified clauses, preprocessor), the
+    latter for extend() and the counters.
+    """
+    pre = Preprocessor(clauses, num_vars)
+    return pre.run(**steps), pre
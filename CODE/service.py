@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+Long-lived solving service: an asyncio server on a Unix or TCP socket that
+answers puzzles and DIMACS formulas, so that callers pay interpreter
+startup and imports once instead of once per puzzle.
+
+Usage:
+  python service.py serve (--unix PATH | --tcp HOST:PORT) [--workers K]
+                    [--cache SIZE] [--store FILE.db] [--warm 9 16 25]
+                    [--encoding ...]
+  python service.py solve (--unix PATH | --tcp HOST:PORT) [--sat]
+                    [--engine dpll|cdcl] <input> [<input> ...]
+
+Protocol: one JSON object per line in each direction. Requests
+
+    {"id": 1, "puzzle": [[0, 3, 0, 0], ...]}
+    {"id": 2, "dimacs": "p cnf 3 2\\n1 -2 0\\n2 3 0\\n", "engine": "dpll"}
+    {"id": 3, "op": "stats"}
+
+are answered in completion order, not request order, with
+
+    {"id": 1, "status": "SAT", "cached": false, "grid": [[1, 3, 5, 2], ...]}
+    {"id": 2, "status": "SAT", "cached": true, "model": [1, 2, -3]}
+    {"id": 3, "requests": 2, "cache": {"entries": 2, "hits": 1, ...}}
+
+status is "SAT", "UNSAT" or "ERROR" (with an "error" message). engine is
+"dpll" or "cdcl" (the default).
+
+Solving runs on a process pool whose workers live as long as the server,
+so every worker keeps the encoder's per-N skeletons warm (--warm builds
+them when the worker starts). Requests that arrive within BATCH_DELAY of
+each other go to the pool together, split over the workers, which saves a
+round trip per request. Results are kept in an LRU cache keyed by a hash
+of the canonical input, and identical requests in flight share one solve.
+For a puzzle that is its canonical form under the symmetries of the rules
+(see canonical.py): the canonical puzzle is solved and its solution mapped
+back, so equivalent puzzles share a cache entry. With --store, puzzle
+solutions are also kept on disk across restarts. For a formula it is the
+parsed clauses, so that whitespace and comments do not matter; formulas
+are parsed on the pool too, so that large ones do not hold up the loop.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import signal
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import count
+from typing import List, Tuple
+
+from canonical import SolutionStore, canonical_form, grid_key, inverse, transform
+from decoder import decode
+from encoder import ENCODINGS, puzzle_cnf, read_puzzle, skeleton
+from main_assignment2 import parse_dimacs
+from solver import solve_cnf
+
+ENGINES = ("dpll", "cdcl")
+# Seconds to wait for more requests before sending a batch to the pool
+BATCH_DELAY = 0.005
+CACHE_SIZE = 4096
+# Longest request or response line: DIMACS text and models of large grids
+MAX_LINE = 64 << 20
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    sub = p.add_subparsers(dest="command", required=True)
+    for name in ("serve", "solve"):
+        q = sub.add_parser(name)
+        where = q.add_mutually_exclusive_group(required=True)
+        where.add_argument("--unix", dest="unix", help="Unix socket path")
+        where.add_argument("--tcp", dest="tcp", help="HOST:PORT")
+    serve = sub.choices["serve"]
+    serve.add_argument("--workers", dest="workers", type=int, default=None,
+                       help="Solver processes (default: all cores)")
+    serve.add_argument("--cache", dest="cache", type=int, default=CACHE_SIZE,
+                       help="Results kept in the LRU cache (0 turns it off)")
+    serve.add_argument("--store", dest="store", default=None,
+                       help="SQLite file that keeps puzzle solutions across restarts")
+    serve.add_argument("--warm", dest="warm", type=int, nargs="*", default=[],
+                       help="Grid sizes whose encodings every worker builds at startup")
+    serve.add_argument("--encoding", dest="encoding", choices=ENCODINGS, default="pairwise")
+    solve = sub.choices["solve"]
+    solve.add_argument("--sat", dest="sat", action="store_true", help="Inputs are DIMACS files")
+    solve.add_argument("--engine", dest="engine", choices=ENGINES, default="cdcl")
+    solve.add_argument("inputs", nargs="+")
+    args = p.parse_args()
+    if args.tcp is not None:
+        host, _, port = args.tcp.rpartition(":")
+        if not port.isdigit():
+            p.error("--tcp expects HOST:PORT")
+        args.host, args.port = host or "127.0.0.1", int(port)
+    return args
+
+
+class ResultCache:
+    """Least recently used (status, answer) pairs by input key."""
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: bytes) -> tuple | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: bytes, entry: tuple) -> None:
+        if self.size <= 0:
+            return
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def as_dict(self) -> dict:
+        return {"entries": len(self.entries), "size": self.size,
+                "hits": self.hits, "misses": self.misses}
+
+
+def cnf_key(clauses, num_vars: int) -> bytes:
+    """Cache key of a parsed FlatCNF: a hash of its buffers."""
+    h = hashlib.blake2b(b"cnf", digest_size=16)
+    h.update(num_vars.to_bytes(8, "little"))
+    h.update(clauses.offsets.tobytes())
+    h.update(clauses.lits.tobytes())
+    return h.digest()
+
+
+def check_puzzle(puzzle) -> List[List[int]]:
+    """The grid of a request, or ValueError if it is not N x N with values 0..N."""
+    if not isinstance(puzzle, list) or not puzzle:
+        raise ValueError("puzzle must be a non-empty list of rows")
+    N = len(puzzle)
+    if math.isqrt(N) ** 2 != N:
+        raise ValueError(f"Grid size {N} is not a perfect square")
+    for row in puzzle:
+        if (not isinstance(row, list) or len(row) != N
+                or not all(type(v) is int and 0 <= v <= N for v in row)):
+            raise ValueError(f"puzzle rows must hold {N} values in 0..{N}")
+    return puzzle
+
+
+class SolveService:
+    """
+    The server side: request parsing, the caches, batching and the pool.
+    handle() serves one connection; close() shuts the pool down.
+    """
+
+    def __init__(self, workers: int | None = None, cache_size: int = CACHE_SIZE,
+                 encoding: str = "pairwise", warm: Tuple[int, ...] = (),
+                 store: str | None = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.encoding = encoding
+        # Spawned rather than forked: forked workers would inherit the
+        # sockets open at the time and keep client connections from closing
+        self.pool = ProcessPoolExecutor(self.workers, multiprocessing.get_context("spawn"),
+                                        initializer=_warm, initargs=(tuple(warm), encoding))
+        self.cache = ResultCache(cache_size)
+        self.store = SolutionStore(store) if store else None
+        # Jobs waiting for the next batch, and the future of every key
+        # queued or being solved
+        self.pending = []
+        self.inflight = {}
+        self.flush = None
+        self.requests = 0
+
+    def close(self) -> None:
+        self.pool.shutdown(cancel_futures=True)
+        if self.store is not None:
+            self.store.close()
+
+    def stats(self) -> dict:
+        stats = {"requests": self.requests, "inflight": len(self.inflight),
+                 "workers": self.workers, "cache": self.cache.as_dict()}
+        if self.store is not None:
+            stats["store"] = {"hits": self.store.hits, "misses": self.store.misses}
+        return stats
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer every request line of a connection, concurrently."""
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Over MAX_LINE: the rest of the stream cannot be framed
+                    await self._send(writer, lock, {"id": None, "status": "ERROR",
+                                                    "error": "Request too long"})
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.ensure_future(self._answer(line, writer, lock))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _answer(self, line, writer, lock):
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            response = {"id": None, "status": "ERROR", "error": f"Bad JSON: {e}"}
+        else:
+            response = await self.respond(request)
+        await self._send(writer, lock, response)
+
+    @staticmethod
+    async def _send(writer, lock, response):
+        data = (json.dumps(response, separators=(",", ":")) + "\n").encode()
+        async with lock:
+            writer.write(data)
+            await writer.drain()
+
+    async def respond(self, request: dict) -> dict:
+        """The response object for one decoded request."""
+        rid = request.get("id") if isinstance(request, dict) else None
+        try:
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            if request.get("op") == "stats":
+                return {"id": rid, **self.stats()}
+            self.requests += 1
+            key, kind, payload, engine, t = await self._job(request)
+        except ValueError as e:
+            return {"id": rid, "status": "ERROR", "error": str(e)}
+
+        status, answer, cached = await self.solve(key, kind, payload, engine)
+        response = {"id": rid, "status": status, "cached": cached}
+        if status == "ERROR":
+            response["error"] = answer
+        elif kind == "puzzle":
+            if answer is not None:
+                response["grid"] = transform(answer, inverse(t))
+        elif answer is not None:
+            response["model"] = answer
+        return response
+
+    async def _job(self, request):
+        """(key, kind, payload, engine, t): puzzles become their canonical form, t the map to it."""
+        engine = request.get("engine", "cdcl")
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+        if "puzzle" in request:
+            canon, t = canonical_form(check_puzzle(request["puzzle"]))
+            return grid_key(canon), "puzzle", canon, engine, t
+        if "dimacs" in request:
+            text = request["dimacs"]
+            if not isinstance(text, str):
+                raise ValueError("dimacs must be a string")
+            loop = asyncio.get_running_loop()
+            try:
+                key, clauses, num_vars = await loop.run_in_executor(self.pool, _parse_cnf, text)
+            except ValueError:
+                raise
+            except Exception as e:
+                # The worker died (or the pool is shutting down)
+                raise ValueError(repr(e)) from None
+            return key, "cnf", (clauses, num_vars), engine, None
+        raise ValueError("Request needs a puzzle or dimacs field")
+
+    async def solve(self, key, kind, payload, engine) -> Tuple[str, object, bool]:
+        """(status, grid or model, cached) for one job."""
+        entry = self.cache.get(key)
+        if entry is None and kind == "puzzle" and self.store is not None:
+            entry = self.store.load(key, len(payload))
+            if entry is not None:
+                self.cache.put(key, entry)
+        if entry is not None:
+            return entry + (True,)
+        future = self.inflight.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self.inflight[key] = future
+            self.pending.append((key, (kind, payload, engine), future))
+            if self.flush is None:
+                self.flush = loop.call_later(BATCH_DELAY, self._flush)
+        # Shielded: a client going away must not cancel a shared solve
+        status, answer = await asyncio.shield(future)
+        return status, answer, False
+
+    def _flush(self):
+        """Send the pending jobs to the pool, one batch per worker at most."""
+        self.flush = None
+        batch, self.pending = self.pending, []
+        loop = asyncio.get_running_loop()
+        for k in range(min(self.workers, len(batch))):
+            chunk = batch[k::self.workers]
+            done = loop.run_in_executor(self.pool, _solve_batch,
+                                        [job for _, job, _ in chunk], self.encoding)
+            done.add_done_callback(partial(self._finish, chunk))
+
+    def _finish(self, chunk, done):
+        try:
+            results = done.result()
+        except Exception as e:
+            # The worker died (or the pool is shutting down)
+            results = [("ERROR", repr(e))] * len(chunk)
+        for (key, job, future), (status, answer) in zip(chunk, results):
+            del self.inflight[key]
+            if status != "ERROR":
+                self.cache.put(key, (status, answer))
+                if job[0] == "puzzle" and self.store is not None:
+                    self.store.save(key, len(job[1]), answer)
+            if not future.done():
+                future.set_result((status, answer))
+
+
+# ---------------------------------------------------------------------------
+# Worker side
+# ---------------------------------------------------------------------------
+
+def _warm(sizes, encoding):
+    for N in sizes:
+        skeleton(N, encoding)
+
+
+def _parse_cnf(text):
+    """(cache key, clauses, num_vars) of DIMACS text; ValueError if it is not DIMACS."""
+    clauses, num_vars = parse_dimacs(io.StringIO(text))
+    return cnf_key(clauses, num_vars), clauses, num_vars
+
+
+def _solve_batch(jobs, encoding):
+    return [_solve_job(kind, payload, engine, encoding) for kind, payload, engine in jobs]
+
+
+def _solve_job(kind, payload, engine, encoding):
+    try:
+        if kind == "puzzle":
+            clauses, num_vars = puzzle_cnf(payload, encoding)
+            status, model = solve_cnf(clauses, num_vars, engine)
+            return status, decode(model, len(payload)) if model is not None else None
+        clauses, num_vars = payload
+        status, model = solve_cnf(clauses, num_vars, engine)
+        return status, list(model) if model is not None else None
+    except Exception as e:
+        return "ERROR", repr(e)
+
+
+async def serve(service: SolveService, unix: str | None = None,
+                host: str | None = None, port: int | None = None) -> None:
+    """Serve until SIGINT or SIGTERM."""
+    if unix is not None:
+        server = await asyncio.start_unix_server(service.handle, unix, limit=MAX_LINE)
+    else:
+        server = await asyncio.start_server(service.handle, host, port, limit=MAX_LINE)
+    loop = asyncio.get_running_loop()
+    stop = loop.create_future()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: stop.done() or stop.set_result(None))
+    try:
+        async with server:
+            await stop
+    finally:
+        if unix is not None:
+            os.unlink(unix)
+
+
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+class Client:
+    """
+    Client for the service. Requests can be sent concurrently over one
+    connection; responses are matched to them by id.
+
+        async with await Client.connect(unix="/tmp/sudoku.sock") as client:
+            response = await client.solve_puzzle(grid)
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.ids = count(1)
+        self.waiting = {}
+        self.receiver = asyncio.ensure_future(self._receive())
+
+    @classmethod
+    async def connect(cls, unix: str | None = None, host: str | None = None,
+                      port: int | None = None) -> "Client":
+        if unix is not None:
+            reader, writer = await asyncio.open_unix_connection(unix, limit=MAX_LINE)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE)
+        return cls(reader, writer)
+
+    async def request(self, request: dict) -> dict:
+        if self.receiver.done():
+            raise ConnectionError("Connection closed")
+        rid = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[rid] = future
+        self.writer.write((json.dumps({**request, "id": rid}, separators=(",", ":")) + "\n").encode())
+        await self.writer.drain()
+        return await future
+
+    async def solve_puzzle(self, puzzle: List[List[int]], engine: str = "cdcl") -> dict:
+        return await self.request({"puzzle": puzzle, "engine": engine})
+
+    async def solve_dimacs(self, text: str, engine: str = "cdcl") -> dict:
+        return await self.request({"dimacs": text, "engine": engine})
+
+    async def stats(self) -> dict:
+        return await self.request({"op": "stats"})
+
+    async def _receive(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self.waiting.pop(response.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            for future in self.waiting.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Connection closed"))
+            self.waiting.clear()
+
+    async def close(self) -> None:
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        self.receiver.cancel()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+async def solve_inputs(args) -> None:
+    """Send every input at once and print "<path> <status>" lines in input order."""
+    async with await Client.connect(args.unix, getattr(args, "host", None),
+                                    getattr(args, "port", None)) as client:
+        requests = []
+        for path in args.inputs:
+            if args.sat:
+                with open(path, "r") as f:
+                    requests.append(client.solve_dimacs(f.read(), args.engine))
+            else:
+                requests.append(client.solve_puzzle(read_puzzle(path), args.engine))
+        for path, response in zip(args.inputs, await asyncio.gather(*requests)):
+            print(f"{path} {response['status']}", flush=True)
+            if response["status"] == "ERROR":
+                print(f"{path}: {response['error']}", file=sys.stderr)
+
+
+def main():
+    args = parse_args()
+    if args.command == "solve":
+        asyncio.run(solve_inputs(args))
+        return
+    service = SolveService(args.workers, args.cache, args.encoding, tuple(args.warm), args.store)
+    try:
+        asyncio.run(serve(service, args.unix, getattr(args, "host", None),
+                          getattr(args, "port", None)))
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
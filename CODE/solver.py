@@ -6,24 +6,1124 @@ THIS is the file to edit.
 Implement: solve_cnf(clauses) -> (status, model_or_None)"""
 
 
-from typing import Iterable, List, Tuple
+import random
+import time
+from array import array
+from collections import deque
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+from cnf import FlatCNF
 #from xml.parsers.expat import model
 
-def solve_cnf(clauses: Iterable[Iterable[int]], num_vars: int) -> Tuple[str, List[int] | None]:
+def solve_cnf(clauses: Iterable[Iterable[int]], num_vars: int,
+              engine: str = "dpll",
+              heuristic: str | None = None,
+              stats: "SolverStats | None" = None,
+              restarts: str | None = "luby",
+              workers: int | None = None,
+              preprocess: bool = False) -> Tuple[str, List[int] | None]:
     """
     Implement your SAT solver here.
     Must return:
       ("SAT", model)  where model is a list of ints (DIMACS-style), or
       ("UNSAT", None)
+
+    engine selects the search: "dpll" (chronological backtracking) or
+    "cdcl" (clause learning with non-chronological backjumping).
+    heuristic selects the branching rule: "mom", "dlcs" or "vsids". By
+    default DPLL branches with MOM and CDCL with VSIDS.
+    stats, if given, collects the counters and timers of the run.
+    restarts selects the CDCL restart policy: "luby", "glucose" or None.
+    clauses can be a FlatCNF (as built by the encoder and the DIMACS
+    parser), which the solver loads without going through per-clause lists.
+    workers > 1 races that many solver configurations in parallel, this
+    one first, and returns the first answer (see portfolio.py).
+    preprocess simplifies the clauses once before search (see
+    preprocess.py); the model is still over the original variables.
+    """
+    if heuristic is None:
+        heuristic = "mom" if engine == "dpll" else "vsids"
+    if preprocess:
+        # Imported here: preprocess builds on this module
+        from preprocess import Preprocessor
+        pre = Preprocessor(clauses, num_vars)
+        clauses = pre.run()
+        if stats is not None:
+            stats.times["preprocess"] += pre.time
+        status, model = solve_cnf(clauses, pre.num_vars, engine, heuristic, stats, restarts, workers)
+        return status, pre.extend(model) if model is not None else None
+    if workers is not None and workers > 1:
+        # Imported here: portfolio builds on this module
+        from portfolio import portfolio, solve_portfolio
+        configs = portfolio(workers)
+        configs[0] = {"engine": engine, "heuristic": heuristic, "restarts": restarts}
+        return solve_portfolio(clauses, num_vars, configs, stats=stats)
+    solver = Solver(clauses, num_vars, heuristic, stats, restarts)
+    return solver.solve(engine)
+
+
+def luby(i: int) -> int:
+    """i-th term (from 1) of the Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, ..."""
+    size, seq = 1, 0
+    x = i - 1
+    while size < x + 1:
+        seq += 1
+        size = 2 * size + 1
+    while size - 1 != x:
+        size = (size - 1) >> 1
+        seq -= 1
+        x %= size
+    return 1 << seq
+
+
+class SolverStats:
+    """
+    Counters, phase timers and trace hooks for a solver run.
+
+    The counters are always kept; they are bumped at most once per decision,
+    conflict or propagation call. The phase timers (seconds spent in
+    propagation, branching, pure-literal elimination and preprocessing) are
+    only filled in with timed=True, since reading the clock around every
+    call is not free.
+
+    Hooks are plain callables and default to None:
+      on_decision(lit, depth)    after a branching literal is assigned
+      on_conflict(clause, depth) on every conflict (clause may be None)
+      on_backtrack(depth)        after undoing the levels above depth
+      on_learn(clause)           for every learnt clause
+    """
+
+    __slots__ = ("decisions", "propagations", "conflicts", "restarts", "max_depth",
+                 "timed", "times", "on_decision", "on_conflict", "on_backtrack", "on_learn")
+
+    PHASES = ("propagate", "branch", "pure", "preprocess")
+
+    def __init__(self, timed: bool = False,
+                 on_decision: Callable | None = None, on_conflict: Callable | None = None,
+                 on_backtrack: Callable | None = None, on_learn: Callable | None = None):
+        self.decisions = 0
+        self.propagations = 0
+        self.conflicts = 0
+        self.restarts = 0
+        self.max_depth = 0
+        self.timed = timed
+        self.times = dict.fromkeys(self.PHASES, 0.0)
+        self.on_decision = on_decision
+        self.on_conflict = on_conflict
+        self.on_backtrack = on_backtrack
+        self.on_learn = on_learn
+
+    def timer(self, fn: Callable, phase: str) -> Callable:
+        """fn wrapped to add its running time to the given phase."""
+        times = self.times
+        clock = time.perf_counter
+
+        def timed(*args):
+            start = clock()
+            try:
+                return fn(*args)
+            finally:
+                times[phase] += clock() - start
+        return timed
+
+    def as_dict(self) -> dict:
+        counters = {name: getattr(self, name) for name in
+                    ("decisions", "propagations", "conflicts", "restarts", "max_depth")}
+        if self.timed:
+            counters["times"] = dict(self.times)
+        return counters
+
+    def reset(self) -> None:
+        """Zero the counters and timers (hooks are kept)."""
+        self.decisions = self.propagations = self.conflicts = self.restarts = self.max_depth = 0
+        for phase in self.times:
+            self.times[phase] = 0.0
+
+    def update(self, counters: dict, add: bool = False) -> None:
+        """
+        Take over the counters (and times) of another run, as given by its
+        as_dict(), or add them to these with add=True (max_depth is the
+        maximum of the two then).
+        """
+        for name, value in counters.items():
+            if name == "times":
+                for phase, seconds in value.items():
+                    self.times[phase] = self.times[phase] + seconds if add else seconds
+            elif not add:
+                setattr(self, name, value)
+            elif name == "max_depth":
+                self.max_depth = max(self.max_depth, value)
+            else:
+                setattr(self, name, getattr(self, name) + value)
+
+    def summary(self) -> str:
+        lines = [f"{name.replace('_', ' '):<16}{value}" for name, value in self.as_dict().items()
+                 if name != "times"]
+        if self.timed:
+            lines += [f"{phase + ' time':<16}{seconds:.3f}s" for phase, seconds in self.times.items()]
+        return "\n".join(lines)
+
+
+class VarHeap:
+    """
+    Binary max-heap of variables ordered by activity, with a position index
+    per variable so that bumping a variable is a single sift-up.
+    """
+
+    def __init__(self, activity):
+        self.activity = activity
+        self.heap = []
+        self.index = array("i", [-1]) * len(activity)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def grow(self, size):
+        self.index += array("i", [-1]) * (size - len(self.index))
+
+    def push(self, var):
+        if self.index[var] >= 0:
+            return
+        self.index[var] = len(self.heap)
+        self.heap.append(var)
+        self._up(self.index[var])
+
+    def pop(self):
+        heap = self.heap
+        top = heap[0]
+        last = heap.pop()
+        self.index[top] = -1
+        if heap:
+            heap[0] = last
+            self.index[last] = 0
+            self._down(0)
+        return top
+
+    def increase(self, var):
+        if self.index[var] >= 0:
+            self._up(self.index[var])
+
+    def _up(self, pos):
+        heap = self.heap
+        index = self.index
+        activity = self.activity
+        var = heap[pos]
+        score = activity[var]
+        while pos > 0:
+            parent = (pos - 1) >> 1
+            above = heap[parent]
+            if activity[above] >= score:
+                break
+            heap[pos] = above
+            index[above] = pos
+            pos = parent
+        heap[pos] = var
+        index[var] = pos
+
+    def _down(self, pos):
+        heap = self.heap
+        index = self.index
+        activity = self.activity
+        size = len(heap)
+        var = heap[pos]
+        score = activity[var]
+        while True:
+            child = 2 * pos + 1
+            if child >= size:
+                break
+            if child + 1 < size and activity[heap[child + 1]] > activity[heap[child]]:
+                child += 1
+            below = heap[child]
+            if activity[below] <= score:
+                break
+            heap[pos] = below
+            index[below] = pos
+            pos = child
+        heap[pos] = var
+        index[var] = pos
+
+
+class Solver:
+    """
+    DPLL and CDCL search on a two-watched-literal propagation core.
+
+    Every clause of two or more literals, learnt ones included, lives in a
+    single FlatCNF (self.db): one int32 buffer of literals plus clause
+    offsets, and clauses are referred to by their index in it. A FlatCNF
+    from the encoder or the DIMACS parser is loaded with a buffer copy.
+    Every clause keeps its two watched literals in its first two positions.
+    A watch is a (clause index, blocker) pair, the blocker being another
+    literal of the clause: while it is true the clause is not looked at.
+    Binary clauses have their own watch lists of (other literal, clause
+    index) pairs instead, which propagation only reads. The watch lists
+    (int32 arrays) are indexed directly by literal: with 2*n+1 slots, lit
+    and -lit never collide since negative indices wrap around to the upper
+    half. The same trick is used for the literal values (1 true, -1 false,
+    0 unassigned).
+
+    Assignments go on a trail; backtracking just pops the trail back to the
+    position recorded when the decision was made. For every variable the
+    decision level and the reason clause (-1 for decisions) are kept so
+    that conflicts can be analysed. Values, levels and reasons are lists,
+    which index faster than arrays in the propagation loop; the other
+    per-variable tables are typed arrays.
+
+    Branching is pluggable: "mom" and "dlcs" rescan the unsatisfied clauses
+    at every decision, "vsids" keeps the variables in a heap ordered by
+    conflict activity (bumped per conflict, decayed by growing the bump
+    increment) and reuses the last value each variable had (phase saving).
+    phase sets the saved phase of variables not assigned yet: "true",
+    "false" or "random". A seed makes "random" reproducible and, with
+    "vsids", breaks the initial ties in the variable order at random, so
+    that solvers with different seeds search differently.
+
+    CDCL restarts (back to level 0, keeping the learnt clauses) follow the
+    Luby sequence or, glucose-style, fire when the LBD (number of distinct
+    decision levels) of recent learnt clauses is high compared to the
+    average so far. Every so many conflicts the worse half of the learnt
+    clauses is dropped, by LBD and then clause activity; glue clauses
+    (LBD <= 2) and clauses that are the reason of an assignment are kept.
+    Dropped clauses are cut out of the buffer and the rest renumbered.
+
+    The solver is incremental: clauses can be added between solve() calls,
+    which keep the learnt clauses, activities and saved phases. solve()
+    takes assumptions (literals decided first, one level each); when they
+    make the formula UNSAT, self.core holds a subset of them that already
+    does. iter_models() enumerates models under assumptions.
+    import_clauses, if set, is called at every CDCL restart and returns
+    clauses to add there; they must follow from the formula (learnt
+    clauses of another solver on the same formula, for instance).
+
+    Counters, timers and hooks live in self.stats (a SolverStats). Timing
+    wraps _propagate and _pick_branch per instance, so an untimed solver
+    runs the plain methods.
     """
-    # Convert to list of lists for proper manipulation
-    clauses_list = [list(clause) for clause in clauses]
-    return dpll_recursive(clauses_list)
 
-def dpll_recursive(clauses, model=None):
+    VAR_DECAY = 0.95
+    CLAUSE_DECAY = 0.999
+    # Luby restarts: conflicts per unit of the sequence
+    LUBY_UNIT = 100
+    # Glucose restarts: window of recent LBDs and the margin over the average
+    GLUCOSE_WINDOW = 50
+    GLUCOSE_K = 0.8
+    # Learnt clause reduction after REDUCE_BASE conflicts, then every
+    # REDUCE_BASE + k * REDUCE_INC conflicts
+    REDUCE_BASE = 2000
+    REDUCE_INC = 300
+    RESTART_POLICIES = ("luby", "glucose")
+    PHASE_POLICIES = ("true", "false", "random")
+
+    def __init__(self, clauses: Iterable[Iterable[int]], num_vars: int,
+                 heuristic: str = "mom", stats: SolverStats | None = None,
+                 restarts: str | None = None,
+                 reduce_base: int | None = None, reduce_inc: int | None = None,
+                 phase: str = "true", seed: int | None = None):
+        pickers = {"mom": self._pick_mom, "dlcs": self._pick_dlcs,
+                   "vsids": self._pick_vsids}
+        if heuristic not in pickers:
+            raise ValueError(f"Unknown heuristic: {heuristic}")
+        self._pick_branch = pickers[heuristic]
+        if restarts is not None and restarts not in self.RESTART_POLICIES:
+            raise ValueError(f"Unknown restart policy: {restarts}")
+        self.restarts = restarts
+        if phase not in self.PHASE_POLICIES:
+            raise ValueError(f"Unknown phase policy: {phase}")
+        self.phase = phase
+        self.seed = seed
+        self.rnd = random.Random(seed)
+        self.reduce_base = reduce_base if reduce_base is not None else self.REDUCE_BASE
+        self.reduce_inc = reduce_inc if reduce_inc is not None else self.REDUCE_INC
+        self.num_vars = num_vars
+        self.db = FlatCNF(num_vars)
+        # Indices of the learnt clauses in db, and index -> [LBD, activity]
+        self.learnts = []
+        self.learnt_info = {}
+        self.clause_inc = 1.0
+        self.watches = [array("i") for _ in range(2 * num_vars + 1)]
+        self.bins = [array("i") for _ in range(2 * num_vars + 1)]
+        self.val = [0] * (2 * num_vars + 1)
+        self.level = [0] * (num_vars + 1)
+        self.reason = [-1] * (num_vars + 1)
+        self.activity = array("d", [0.0]) * (num_vars + 1)
+        self.var_inc = 1.0
+        self.polarity = self._phases(num_vars + 1)
+        self.order = None
+        self.seen = bytearray(num_vars + 1)
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+        self.ok = True
+        self.core = []
+        # Activation variables of iter_models, left out of the models
+        self.selectors = set()
+        self.import_clauses = None
+
+        self.stats = stats if stats is not None else SolverStats()
+        if self.stats.timed:
+            self._propagate = self.stats.timer(self._propagate, "propagate")
+            self._pick_branch = self.stats.timer(self._pick_branch, "branch")
+
+        if not isinstance(clauses, FlatCNF):
+            clauses = FlatCNF.from_clauses(clauses, num_vars)
+        self._load(clauses)
+
+        if heuristic == "vsids":
+            if seed is not None:
+                # Below the first bump (1.0), so this only breaks ties
+                for var in range(1, self.num_vars + 1):
+                    self.activity[var] = self.rnd.random() * 1e-3
+            self.order = VarHeap(self.activity)
+            for var in range(1, self.num_vars + 1):
+                self.order.push(var)
+
+    def _grow(self, num_vars):
+        # Literals outside the header range: widen every literal-indexed
+        # table, keeping negative literals in the upper half
+        old = self.num_vars
+        extra = num_vars - old
+        self.watches[old + 1:old + 1] = [array("i") for _ in range(2 * extra)]
+        self.bins[old + 1:old + 1] = [array("i") for _ in range(2 * extra)]
+        self.val[old + 1:old + 1] = [0] * (2 * extra)
+        self.level += [0] * extra
+        self.reason += [-1] * extra
+        self.activity += array("d", [0.0]) * extra
+        self.polarity += self._phases(extra)
+        self.seen += bytearray(extra)
+        if self.order is not None:
+            self.order.grow(num_vars + 1)
+            for var in range(old + 1, num_vars + 1):
+                self.order.push(var)
+        self.num_vars = num_vars
+        self.db.num_vars = num_vars
+
+    def _phases(self, count):
+        """Initial saved phases for count variables, by the phase policy."""
+        if self.phase == "random":
+            return array("b", [self.rnd.random() < 0.5 for _ in range(count)])
+        return array("b", [self.phase == "true"]) * count
+
+    def _load(self, cnf):
+        """
+        Take over the clauses of a FlatCNF: copy its buffers and watch the
+        first two literals of every clause. The few clauses that need
+        simplifying first (units, tautologies, repeated literals) are cut
+        out of the copy and go through add_clause instead.
+        """
+        lits = cnf.lits
+        offsets = cnf.offsets
+        if lits:
+            top = max(max(lits), -min(lits))
+            if top > self.num_vars:
+                self._grow(top)
+        special = []
+        for i in range(len(offsets) - 1):
+            start = offsets[i]
+            size = offsets[i + 1] - start
+            if size == 2:
+                a = lits[start]
+                b = lits[start + 1]
+                if a != b and a != -b:
+                    continue
+            elif size > 2 and len(set(map(abs, lits[start:start + size]))) == size:
+                continue
+            special.append(i)
+
+        db = self.db
+        copy = cnf.copy()
+        db.lits = copy.lits
+        db.offsets = copy.offsets
+        if special:
+            db.delete(special)
+        for c in range(len(db)):
+            self._watch(c)
+        for i in special:
+            self.add_clause(cnf[i])
+
+    def add_clause(self, clause) -> bool:
+        """Add a clause at decision level 0. Returns False once UNSAT."""
+        if not self.ok:
+            return False
+        lits = []
+        seen = set()
+        for lit in clause:
+            if -lit in seen:
+                return True  # Tautology
+            if lit not in seen:
+                seen.add(lit)
+                lits.append(lit)
+        top = max((abs(l) for l in lits), default=0)
+        if top > self.num_vars:
+            self._grow(top)
+
+        val = self.val
+        if any(val[l] == 1 for l in lits):
+            return True
+        lits = [l for l in lits if val[l] == 0]
+        if not lits:
+            self.ok = False
+        elif len(lits) == 1:
+            self._assign(lits[0])
+            if self._propagate() is not None:
+                self.ok = False
+        else:
+            self.db.append(lits)
+            self._watch(len(self.db) - 1)
+        return self.ok
+
+    def _watch(self, c):
+        """Watch the first two literals of clause c, each with the other as blocker."""
+        lits = self.db.lits
+        offsets = self.db.offsets
+        a = lits[offsets[c]]
+        b = lits[offsets[c] + 1]
+        if offsets[c + 1] - offsets[c] == 2:
+            self.bins[a].extend((b, c))
+            self.bins[b].extend((a, c))
+        else:
+            self.watches[a].extend((c, b))
+            self.watches[b].extend((c, a))
+
+    def _assign(self, lit, reason=-1):
+        var = abs(lit)
+        self.val[lit] = 1
+        self.val[-lit] = -1
+        self.level[var] = len(self.trail_lim)
+        self.reason[var] = reason
+        self.trail.append(lit)
+
+    def _propagate(self):
+        """Propagate the trail from qhead. Returns a conflicting clause index or None."""
+        val = self.val
+        watches = self.watches
+        bins = self.bins
+        lits = self.db.lits
+        offsets = self.db.offsets
+        trail = self.trail
+        level = self.level
+        reason = self.reason
+        cur_level = len(self.trail_lim)
+        conflict = None
+        start = qhead = self.qhead
+
+        while qhead < len(trail):
+            false_lit = -trail[qhead]
+            qhead += 1
+            # Binary clauses first: their watches never move
+            pairs = iter(bins[false_lit])
+            for other, c in zip(pairs, pairs):
+                b = val[other]
+                if b == 1:
+                    continue
+                if b == -1:
+                    conflict = c
+                    break
+                val[other] = 1
+                val[-other] = -1
+                var = other if other > 0 else -other
+                level[var] = cur_level
+                reason[var] = c
+                trail.append(other)
+            if conflict is not None:
+                break
+
+            ws = watches[false_lit]
+            i = j = 0
+            n = len(ws)
+            while i < n:
+                c = ws[i]
+                blocker = ws[i + 1]
+                i += 2
+                if val[blocker] == 1:
+                    # Entries only move down once a watch has left the list
+                    if j + 2 != i:
+                        ws[j] = c
+                        ws[j + 1] = blocker
+                    j += 2
+                    continue
+                # Keep the falsified watch in the second position
+                pos = offsets[c]
+                first = lits[pos]
+                if first == false_lit:
+                    first = lits[pos + 1]
+                    lits[pos] = first
+                    lits[pos + 1] = false_lit
+                if val[first] == 1:
+                    if j + 2 != i:
+                        ws[j] = c
+                    ws[j + 1] = first
+                    j += 2
+                    continue
+                # Look for a replacement watch
+                for k in range(pos + 2, offsets[c + 1]):
+                    lit = lits[k]
+                    if val[lit] != -1:
+                        lits[pos + 1] = lit
+                        lits[k] = false_lit
+                        moved = watches[lit]
+                        moved.append(c)
+                        moved.append(first)
+                        break
+                else:
+                    if j + 2 != i:
+                        ws[j] = c
+                    ws[j + 1] = first
+                    j += 2
+                    if val[first] == -1:
+                        conflict = c
+                        break
+                    # Unit
+                    val[first] = 1
+                    val[-first] = -1
+                    var = first if first > 0 else -first
+                    level[var] = cur_level
+                    reason[var] = c
+                    trail.append(first)
+            if conflict is not None:
+                del ws[j:i]
+                break
+            del ws[j:]
+        if conflict is not None:
+            self.stats.propagations += qhead - start
+            self.qhead = len(trail)
+            return conflict
+        self.stats.propagations += qhead - start
+        self.qhead = qhead
+        return None
+
+    def _backtrack(self, level):
+        """Undo every assignment made above the given decision level."""
+        if len(self.trail_lim) <= level:
+            return
+        val = self.val
+        reason = self.reason
+        polarity = self.polarity
+        trail = self.trail
+        pos = self.trail_lim[level]
+        for lit in trail[pos:]:
+            val[lit] = 0
+            val[-lit] = 0
+            var = abs(lit)
+            reason[var] = -1
+            polarity[var] = lit > 0
+        if self.order is not None:
+            push = self.order.push
+            for lit in trail[pos:]:
+                push(abs(lit))
+        del trail[pos:]
+        del self.trail_lim[level:]
+        self.qhead = pos
+        if self.stats.on_backtrack is not None:
+            self.stats.on_backtrack(level)
+
+    def _pick_mom(self):
+        """
+        MOM's heuristic on the current assignment: among the unsatisfied
+        clauses of minimal (unassigned) length, take the variable maximising
+        (f(x) + f(-x)) * 2^k + f(x) * f(-x), with k = 3.
+        """
+        val = self.val
+        min_len = None
+        count = {}
+        for c in self.db:
+            free = []
+            for lit in c:
+                v = val[lit]
+                if v == 1:
+                    break
+                if v == 0:
+                    free.append(lit)
+            else:
+                size = len(free)
+                if min_len is None or size < min_len:
+                    min_len = size
+                    count = {}
+                if size == min_len:
+                    for lit in free:
+                        count[lit] = count.get(lit, 0) + 1
+
+        if min_len is None:
+            return None
+
+        best_lit = None
+        best_f = -1
+        for lit in count:
+            var = abs(lit)
+            x = count.get(var, 0)
+            x_prime = count.get(-var, 0)
+            f_x = (x + x_prime) * 2 ** 3 + x * x_prime
+            if f_x > best_f:
+                best_f = f_x
+                best_lit = var if x >= x_prime else -var
+        return best_lit
+
+    def _pick_dlcs(self):
+        """
+        DLCS on the current assignment: the variable occurring most often in
+        unsatisfied clauses, set to its more frequent polarity.
+        """
+        val = self.val
+        count = {}
+        for c in self.db:
+            if any(val[lit] == 1 for lit in c):
+                continue
+            for lit in c:
+                if val[lit] == 0:
+                    count[lit] = count.get(lit, 0) + 1
+
+        best_lit = None
+        best_sum = 0
+        for lit in count:
+            var = abs(lit)
+            cp = count.get(var, 0)
+            cn = count.get(-var, 0)
+            if cp + cn > best_sum:
+                best_sum = cp + cn
+                best_lit = var if cp >= cn else -var
+        return best_lit
+
+    def _pick_vsids(self):
+        """Most active unassigned variable from the heap, in its saved phase."""
+        val = self.val
+        order = self.order
+        while len(order):
+            var = order.pop()
+            if val[var] == 0:
+                return var if self.polarity[var] else -var
+        return None
+
+    def _bump(self, var):
+        activity = self.activity
+        activity[var] += self.var_inc
+        if activity[var] > 1e100:
+            for k in range(len(activity)):
+                activity[k] *= 1e-100
+            self.var_inc *= 1e-100
+        if self.order is not None:
+            self.order.increase(var)
+
+    def _bump_clause(self, info):
+        info[1] += self.clause_inc
+        if info[1] > 1e20:
+            for other in self.learnt_info.values():
+                other[1] *= 1e-20
+            self.clause_inc *= 1e-20
+
+    def _analyze(self, conflict):
+        """
+        First-UIP conflict analysis. Returns the learnt clause, asserting
+        literal first and a literal of the backjump level second, together
+        with that backjump level.
+        """
+        seen = self.seen
+        level = self.level
+        reason = self.reason
+        trail = self.trail
+        lits = self.db.lits
+        offsets = self.db.offsets
+        learnt_info = self.learnt_info
+        cur_level = len(self.trail_lim)
+
+        learnt = [0]
+        pending = 0
+        index = len(trail) - 1
+        c = conflict
+        pvar = 0
+        while True:
+            info = learnt_info.get(c)
+            if info is not None:
+                self._bump_clause(info)
+            # The implied literal of a reason clause can be anywhere in it,
+            # and is skipped by staying marked until the clause is done
+            for k in range(offsets[c], offsets[c + 1]):
+                q = lits[k]
+                var = abs(q)
+                if not seen[var] and level[var] > 0:
+                    seen[var] = True
+                    self._bump(var)
+                    if level[var] >= cur_level:
+                        pending += 1
+                    else:
+                        learnt.append(q)
+            seen[pvar] = False
+            # Walk back to the next marked literal of the current level
+            while not seen[abs(trail[index])]:
+                index -= 1
+            p = trail[index]
+            index -= 1
+            pvar = abs(p)
+            pending -= 1
+            if pending == 0:
+                seen[pvar] = False
+                break
+            c = reason[pvar]
+        learnt[0] = -p
+
+        # Drop literals implied by the rest of the clause
+        kept = [learnt[0]]
+        for q in learnt[1:]:
+            r = reason[abs(q)]
+            if r < 0 or not all(seen[abs(x)] or level[abs(x)] == 0
+                                for x in lits[offsets[r]:offsets[r + 1]]):
+                kept.append(q)
+        for q in learnt[1:]:
+            seen[abs(q)] = False
+        learnt = kept
+
+        if len(learnt) == 1:
+            return learnt, 0
+        best = 1
+        for k in range(2, len(learnt)):
+            if level[abs(learnt[k])] > level[abs(learnt[best])]:
+                best = k
+        learnt[1], learnt[best] = learnt[best], learnt[1]
+        return learnt, level[abs(learnt[1])]
+
+    def solve(self, engine: str = "dpll",
+              assumptions: Iterable[int] = ()) -> Tuple[str, List[int] | None]:
+        """
+        Solve under the given assumptions. On UNSAT, self.core is the
+        subset of the assumptions responsible (empty if the clauses alone
+        are UNSAT; with the DPLL engine, all of them if search is needed to
+        refute them). The solver is back at level 0 afterwards.
+        """
+        assumptions = list(assumptions)
+        self.core = []
+        top = max((abs(lit) for lit in assumptions), default=0)
+        if top > self.num_vars:
+            self._grow(top)
+        if engine == "dpll":
+            return self._solve_dpll(assumptions)
+        if engine == "cdcl":
+            return self._solve_cdcl(assumptions)
+        raise ValueError(f"Unknown engine: {engine}")
+
+    def implied(self, assumptions: Iterable[int] = ()) -> List[int] | None:
+        """
+        The literals unit propagation sets from the clauses and the
+        assumptions, or None if it runs into a conflict. No search is done
+        and the solver is back at level 0 afterwards.
+        """
+        assumptions = list(assumptions)
+        top = max((abs(lit) for lit in assumptions), default=0)
+        if top > self.num_vars:
+            self._grow(top)
+        if not self.ok or self._propagate() is not None:
+            self.ok = False
+            return None
+        val = self.val
+        try:
+            for lit in assumptions:
+                if val[lit] == -1:
+                    return None
+                if val[lit] == 0:
+                    self.trail_lim.append(len(self.trail))
+                    self._assign(lit)
+                    if self._propagate() is not None:
+                        return None
+            return list(self.trail)
+        finally:
+            self._backtrack(0)
+
+    def new_var(self) -> int:
+        """A fresh variable, for selectors and other auxiliary literals."""
+        self._grow(self.num_vars + 1)
+        return self.num_vars
+
+    def iter_models(self, limit: int | None = None, engine: str = "cdcl",
+                    assumptions: Iterable[int] = (),
+                    variables: Iterable[int] | None = None) -> Iterator[List[int]]:
+        """
+        Yield up to limit models (all of them if None) under assumptions.
+        Models that agree on variables (default: every variable) count as
+        one. Each model is blocked by a clause guarded by a fresh selector
+        variable, which is switched off when the enumeration ends, so the
+        solver stays usable; a uniqueness check is iter_models(2).
+        """
+        keep = set(variables) if variables is not None else None
+        selector = self.new_var()
+        self.selectors.add(selector)
+        assumptions = list(assumptions) + [selector]
+        try:
+            found = 0
+            while limit is None or found < limit:
+                status, model = self.solve(engine, assumptions)
+                if status != "SAT":
+                    break
+                yield model
+                found += 1
+                block = [-lit for lit in model if keep is None or abs(lit) in keep]
+                if not self.add_clause(block + [-selector]):
+                    break
+        finally:
+            self.core = [lit for lit in self.core if lit != selector]
+            self.add_clause([-selector])
+
+    def _model(self):
+        selectors = self.selectors
+        if not selectors:
+            return sorted(self.trail)
+        return sorted(lit for lit in self.trail if abs(lit) not in selectors)
+
+    def _assume(self, assumptions):
+        """
+        Open a level for every assumption already true, up to the first one
+        still to decide. Returns that literal, None once all are placed, or
+        False if one is false (self.core is then set).
+        """
+        val = self.val
+        trail_lim = self.trail_lim
+        while len(trail_lim) < len(assumptions):
+            p = assumptions[len(trail_lim)]
+            if val[p] == 1:
+                trail_lim.append(len(self.trail))
+            elif val[p] == -1:
+                self.core = self._analyze_final(p)
+                return False
+            else:
+                return p
+        return None
+
+    def _analyze_final(self, p):
+        """The assumptions that imply -p, together with p itself."""
+        core = [p]
+        seen = self.seen
+        level = self.level
+        reason = self.reason
+        lits = self.db.lits
+        offsets = self.db.offsets
+        if level[abs(p)] == 0:
+            return core
+        seen[abs(p)] = True
+        for lit in reversed(self.trail[self.trail_lim[0]:]):
+            var = abs(lit)
+            if not seen[var]:
+                continue
+            r = reason[var]
+            if r < 0:
+                # Only assumptions are decided below the first free level
+                core.append(lit)
+            else:
+                for q in lits[offsets[r]:offsets[r + 1]]:
+                    if level[abs(q)] > 0:
+                        seen[abs(q)] = True
+            seen[var] = False
+        return core
+
+    def _solve_dpll(self, assumptions=()):
+        """Chronological DPLL: flip the last unflipped decision on conflict."""
+        if not self.ok or self._propagate() is not None:
+            self.ok = False
+            return "UNSAT", None
+
+        stats = self.stats
+        # One entry per level; assumption levels count as already flipped
+        flipped = []
+        while True:
+            conflict = self._propagate()
+            if conflict is not None:
+                stats.conflicts += 1
+                conflict_level = len(self.trail_lim)
+                if stats.on_conflict is not None:
+                    stats.on_conflict(self.db[conflict], conflict_level)
+                if self.order is not None:
+                    for lit in self.db[conflict]:
+                        self._bump(abs(lit))
+                    self.var_inc /= self.VAR_DECAY
+                while flipped and flipped[-1]:
+                    flipped.pop()
+                if not flipped:
+                    self._backtrack(0)
+                    if assumptions and conflict_level > 0:
+                        self.core = list(assumptions)
+                    else:
+                        self.ok = False
+                    return "UNSAT", None
+                level = len(flipped) - 1
+                lit = self.trail[self.trail_lim[level]]
+                self._backtrack(level)
+                flipped[-1] = True
+                self.trail_lim.append(len(self.trail))
+                self._assign(-lit)
+                continue
+
+            lit = self._assume(assumptions) if assumptions else None
+            flipped.extend([True] * (len(self.trail_lim) - len(flipped)))
+            if lit is False:
+                self._backtrack(0)
+                return "UNSAT", None
+            if lit is not None:
+                flipped.append(True)
+                self._decide(lit)
+                continue
+
+            lit = self._pick_branch()
+            if lit is None:
+                model = self._model()
+                self._backtrack(0)
+                return "SAT", model
+            flipped.append(False)
+            self._decide(lit)
+
+    def _solve_cdcl(self, assumptions=()):
+        """
+        Conflict-driven clause learning as an explicit loop: learn the
+        first-UIP clause of every conflict and backjump to the second
+        highest level in it.
+        """
+        if not self.ok or self._propagate() is not None:
+            self.ok = False
+            return "UNSAT", None
+
+        stats = self.stats
+        level = self.level
+        # Luby: restart once budget conflicts have passed since the last one
+        restart_count = 0
+        budget = luby(1) * self.LUBY_UNIT
+        since_restart = 0
+        # Glucose: recent LBDs against the running average
+        recent = deque(maxlen=self.GLUCOSE_WINDOW)
+        recent_sum = lbd_sum = 0
+        # Conflicts of this call; stats may be shared across calls
+        conflicts = 0
+        reductions = 0
+        next_reduce = self.reduce_base
+        while True:
+            conflict = self._propagate()
+            if conflict is not None:
+                stats.conflicts += 1
+                if stats.on_conflict is not None:
+                    stats.on_conflict(self.db[conflict], len(self.trail_lim))
+                if not self.trail_lim:
+                    self.ok = False
+                    return "UNSAT", None
+                learnt, back_level = self._analyze(conflict)
+                if stats.on_learn is not None:
+                    stats.on_learn(learnt)
+                lbd = len({level[abs(lit)] for lit in learnt})
+                self._backtrack(back_level)
+                if len(learnt) == 1:
+                    self._assign(learnt[0])
+                else:
+                    c = len(self.db)
+                    self.db.append(learnt)
+                    self.learnts.append(c)
+                    self.learnt_info[c] = [lbd, 0.0]
+                    self._watch(c)
+                    self._assign(learnt[0], c)
+                self.var_inc /= self.VAR_DECAY
+                self.clause_inc /= self.CLAUSE_DECAY
+
+                conflicts += 1
+                since_restart += 1
+                restart = False
+                if self.restarts == "luby":
+                    restart = since_restart >= budget
+                elif self.restarts == "glucose":
+                    if len(recent) == recent.maxlen:
+                        recent_sum -= recent[0]
+                    recent.append(lbd)
+                    recent_sum += lbd
+                    lbd_sum += lbd
+                    restart = (len(recent) == recent.maxlen and
+                               recent_sum * self.GLUCOSE_K / len(recent) > lbd_sum / conflicts)
+                if restart:
+                    stats.restarts += 1
+                    restart_count += 1
+                    budget = luby(restart_count + 1) * self.LUBY_UNIT
+                    since_restart = 0
+                    recent.clear()
+                    recent_sum = 0
+                    self._backtrack(0)
+                    if self.import_clauses is not None:
+                        for clause in self.import_clauses():
+                            if not self.add_clause(clause):
+                                return "UNSAT", None
+
+                if conflicts >= next_reduce:
+                    reductions += 1
+                    next_reduce += self.reduce_base + reductions * self.reduce_inc
+                    self._reduce_db()
+                continue
+
+            lit = self._assume(assumptions) if assumptions else None
+            if lit is False:
+                self._backtrack(0)
+                return "UNSAT", None
+            if lit is None:
+                lit = self._pick_branch()
+                if lit is None:
+                    model = self._model()
+                    self._backtrack(0)
+                    return "SAT", model
+            self._decide(lit)
+
+    def _reduce_db(self):
+        """Drop the worse half of the learnt clauses (see the class docstring)."""
+        info = self.learnt_info
+        reason = self.reason
+        lits = self.db.lits
+        offsets = self.db.offsets
+        # Worst first: highest LBD, then lowest activity
+        ranked = sorted(self.learnts, key=lambda c: (-info[c][0], info[c][1]))
+        limit = len(ranked) // 2
+        removed = []
+        for c in ranked:
+            if len(removed) == limit:
+                break
+            pos = offsets[c]
+            if info[c][0] > 2 and reason[abs(lits[pos])] != c and reason[abs(lits[pos + 1])] != c:
+                removed.append(c)
+        if removed:
+            self._delete(removed)
+
+    def _delete(self, removed):
+        """Cut clauses out of db and renumber the watches, reasons and learnt clauses."""
+        remap = self.db.delete(removed)
+        renumber = remap.__getitem__
+        # Clauses before the first removed one keep their index
+        low = min(removed)
+        watches = self.watches
+        for k, ws in enumerate(watches):
+            if ws and max(ws[::2]) >= low:
+                kept = array("i")
+                for i in range(0, len(ws), 2):
+                    c = remap[ws[i]]
+                    if c >= 0:
+                        kept.append(c)
+                        kept.append(ws[i + 1])
+                watches[k] = kept
+        # Binary clauses are never dropped (their LBD is at most 2)
+        for ws in self.bins:
+            if ws and max(ws[1::2]) >= low:
+                ws[1::2] = array("i", map(renumber, ws[1::2]))
+        reason = self.reason
+        for lit in self.trail:
+            var = abs(lit)
+            if reason[var] >= 0:
+                reason[var] = remap[reason[var]]
+        self.learnts = [remap[c] for c in self.learnts if remap[c] >= 0]
+        self.learnt_info = {remap[c]: entry for c, entry in self.learnt_info.items() if remap[c] >= 0}
+
+    def _decide(self, lit):
+        """Open a new decision level with lit as its branching literal."""
+        stats = self.stats
+        stats.decisions += 1
+        self.trail_lim.append(len(self.trail))
+        self._assign(lit)
+        depth = len(self.trail_lim)
+        if depth > stats.max_depth:
+            stats.max_depth = depth
+        if stats.on_decision is not None:
+            stats.on_decision(lit, depth)
+
+
+def dpll_recursive(clauses, model=None, stats=None, depth=0):
     # Initialize model if None
     if model is None:
         model = set()
+    # Counters and timers go to stats (a SolverStats) instead of stdout
+    if stats is None:
+        stats = SolverStats()
 
      # SAT
     if clauses == []:
@@ -33,16 +1133,28 @@ def dpll_recursive(clauses, model=None):
     if any(clause == [] for clause in clauses):
         return "UNSAT", None
     
-    # Remove Tautologies
-    clauses = remove_tautologies(clauses)
+    # Remove Tautologies (assigning literals never creates any)
+    if depth == 0:
+        clauses = remove_tautologies(clauses)
     # Unit Propagation
-    clauses, model = unit_propagation(clauses, model)
+    before = len(model)
+    if stats.timed:
+        clauses, model = stats.timer(unit_propagation, "propagate")(clauses, model)
+    else:
+        clauses, model = unit_propagation(clauses, model)
 
     if clauses is None:
+        stats.conflicts += 1
+        if stats.on_conflict is not None:
+            stats.on_conflict(None, depth)
         return "UNSAT", None
+    stats.propagations += len(model) - before
     
     # Pure Literal Elimination
-    clauses, model = pure_literal_elimination(clauses, model)
+    if stats.timed:
+        clauses, model = stats.timer(pure_literal_elimination, "pure")(clauses, model)
+    else:
+        clauses, model = pure_literal_elimination(clauses, model)
     
     # Check again after pure literal elimination
     if clauses == []:
@@ -53,7 +1165,10 @@ def dpll_recursive(clauses, model=None):
     
     # Branching Step
     # literal = branching_step(clauses, model)
-    literal = maximum_occurence_minimal(clauses, 3)
+    if stats.timed:
+        literal = stats.timer(maximum_occurence_minimal, "branch")(clauses, 3)
+    else:
+        literal = maximum_occurence_minimal(clauses, 3)
 
     if literal is None:
         # No more literals to branch on
@@ -64,28 +1179,31 @@ def dpll_recursive(clauses, model=None):
             return "UNSAT", None
 
     # Try assigning literal to True
+    stats.decisions += 1
+    stats.max_depth = max(stats.max_depth, depth + 1)
+    if stats.on_decision is not None:
+        stats.on_decision(literal, depth + 1)
     model_copy = model.copy()
     model_copy.add(literal)
     # Simplify clauses with the assigned literal
     clauses_simplified = remove_literal(clauses, literal)
-    sat, model2 = dpll_recursive(clauses_simplified, model_copy)
+    sat, model2 = dpll_recursive(clauses_simplified, model_copy, stats, depth + 1)
 
     if sat == "SAT":
-        print("Found SAT by assigning literal:", literal)
         # Ensure model is returned as sorted list
         if isinstance(model2, set):
             return "SAT", sorted(list(model2))
         return "SAT", model2
     
     # Backtrack: try assigning literal to False
-    print("Backtracking on literal:", literal)
+    if stats.on_backtrack is not None:
+        stats.on_backtrack(depth)
     model_copy = model.copy()
     model_copy.add(-literal)
     # Simplify clauses with the negated literal
     clauses_simplified = remove_literal(clauses, -literal)
-    sat, model3 = dpll_recursive(clauses_simplified, model_copy)
+    sat, model3 = dpll_recursive(clauses_simplified, model_copy, stats, depth + 1)
     if sat == "SAT":
-        print("Found SAT by assigning literal:", -literal)
         # Ensure model is returned as sorted list
         if isinstance(model3, set):
             return "SAT", sorted(list(model3))
@@ -149,9 +1267,6 @@ def branching_step(clauses, model):
             max_sum = combined_sum
             max_literal = literal
 
-    print("Branching on literal:", max_literal)
-    print("Max combined sum:", max_sum)
-        
     return max_literal
 
 def maximum_occurence_minimal(clauses, k):
@@ -190,8 +1305,6 @@ def maximum_occurence_minimal(clauses, k):
         if f_x > max_f:
             max_f = f_x
             max_literal = literal
-    print("MOM's literal:", max_literal)
-    print("max_function_value:", max_f)
     return max_literal
 
 
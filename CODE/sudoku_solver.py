@@ -0,0 +1,233 @@
+"""
+Direct solver for non-consecutive Sudoku, as an alternative backend to
+encoding the puzzle to CNF and running the SAT solver.
+
+Every cell keeps a candidate bitmask (bit v-1 for value v, cells in
+row-major order). Fixing a cell removes its value from the row, column
+and box peers and its two adjacent values from the orthogonal neighbours;
+a value with a single place left in a row, column or box fixes that cell,
+and a cell down to v and v+2 removes v+1 from its neighbours.
+Search picks the cell with the fewest candidates (MRV), divided by a
+weight counting the dead ends the cell took part in (dom/wdeg), and undoes
+its changes from a trail of (cell, previous mask) entries.
+
+The answer is the same SAT/UNSAT as to_cnf + solve_cnf, and the model uses
+the same var(r,c,v) = r*N*N + c*N + v numbering.
+"""
+
+import math
+from functools import lru_cache
+from typing import List, Tuple
+
+from encoder import read_puzzle
+from solver import SolverStats
+
+
+def solve_sudoku(puzzle: List[List[int]],
+                 stats: SolverStats | None = None) -> Tuple[str, List[int] | None]:
+    """
+    Solve an N x N puzzle (0 = empty) directly. Returns ("SAT", model) with
+    the model over all N^3 variables, as solve_cnf would, or ("UNSAT", None).
+    """
+    return SudokuSolver(puzzle, stats).solve()
+
+
+def solve_sudoku_file(input_path: str,
+                      stats: SolverStats | None = None) -> Tuple[str, List[int] | None]:
+    return solve_sudoku(read_puzzle(input_path), stats)
+
+
+@lru_cache(maxsize=None)
+def _layout(N):
+    """
+    Units (cell tuples that hold every value once), and per cell its peers
+    and orthogonal neighbours. The boxes are the encoder's: b x b blocks
+    with b = isqrt(N), starting at multiples of b in both directions. They
+    only tile the grid when N = b * b; otherwise they cover its top-left
+    corner and, having fewer than N cells, only keep their values distinct.
+    """
+    b = math.isqrt(N)
+    units = [tuple(r * N + c for c in range(N)) for r in range(N)]
+    units += [tuple(r * N + c for r in range(N)) for c in range(N)]
+    boxes = [tuple((b * i + di) * N + b * j + dj for di in range(b) for dj in range(b))
+             for i in range(b) for j in range(b)]
+    peers = [set() for _ in range(N * N)]
+    for unit in units + boxes:
+        for cell in unit:
+            peers[cell].update(unit)
+    if b * b == N:
+        units += boxes
+    neighbours = []
+    for cell in range(N * N):
+        peers[cell].discard(cell)
+        r, c = divmod(cell, N)
+        neighbours.append(tuple(nr * N + nc for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1))
+                                if 0 <= nr < N and 0 <= nc < N))
+    return tuple(units), tuple(tuple(sorted(p)) for p in peers), tuple(neighbours)
+
+
+class SudokuSolver:
+    """Candidate-bitmask propagation with dom/wdeg branching and trail-based backtracking."""
+
+    __slots__ = ("N", "full", "cand", "trail", "units", "peers", "neighbours", "stats", "ok", "weight", "_queue")
+
+    def __init__(self, puzzle: List[List[int]], stats: SolverStats | None = None):
+        N = len(puzzle)
+        self.N = N
+        self.full = (1 << N) - 1
+        self.cand = [self.full] * (N * N)
+        self.trail = []
+        self.units, self.peers, self.neighbours = _layout(N)
+        self.stats = stats if stats is not None else SolverStats()
+        self.ok = True
+        self.weight = [1] * (N * N)
+
+        # Clues are fixed up front and propagated together by solve()
+        self._queue = []
+        for r, row in enumerate(puzzle):
+            for c, v in enumerate(row):
+                if v != 0:
+                    cell = r * N + c
+                    bit = 1 << (v - 1)
+                    if not 0 < v <= N or not self.cand[cell] & bit:
+                        self.ok = False
+                    self.cand[cell] = bit
+                    self._queue.append(cell)
+
+    def _propagate(self, queue) -> bool:
+        """Propagate the fixed cells in queue to a fixpoint. False on a contradiction."""
+        cand = self.cand
+        trail = self.trail
+        full = self.full
+        peers = self.peers
+        neighbours = self.neighbours
+        stats = self.stats
+        while queue:
+            while queue:
+                cell = queue.pop()
+                bit = cand[cell]
+                stats.propagations += 1
+                rest = bit & (bit - 1)
+                if not rest:
+                    # The values next to bit are the bits next to it
+                    near = ((bit << 1) | (bit >> 1)) & full
+                    groups = ((bit, peers[cell]), (near, neighbours[cell]))
+                else:
+                    # Candidates v and v+2: v+1 is next to both
+                    groups = (((bit & -bit) << 1, neighbours[cell]),)
+                for mask, group in groups:
+                    for other in group:
+                        m = cand[other]
+                        if m & mask:
+                            trail.append((other, m))
+                            m &= ~mask
+                            cand[other] = m
+                            if not m:
+                                self.weight[other] += 1
+                                self.weight[cell] += 1
+                                return False
+                            rest = m & (m - 1)
+                            if not rest or rest == (m & -m) << 2:
+                                queue.append(other)
+
+            # Values with a single place left in a unit (hidden singles)
+            for unit in self.units:
+                once = twice = 0
+                for cell in unit:
+                    m = cand[cell]
+                    twice |= once & m
+                    once |= m
+                if once != full:
+                    for cell in unit:
+                        self.weight[cell] += 1
+                    return False
+                hidden = once & ~twice
+                while hidden:
+                    bit = hidden & -hidden
+                    hidden ^= bit
+                    for cell in unit:
+                        if cand[cell] & bit:
+                            break
+                    else:
+                        return False
+                    if cand[cell] != bit:
+                        trail.append((cell, cand[cell]))
+                        cand[cell] = bit
+                        queue.append(cell)
+        return True
+
+    def _undo(self, mark):
+        cand = self.cand
+        trail = self.trail
+        while len(trail) > mark:
+            cell, m = trail.pop()
+            cand[cell] = m
+
+    def _pick(self):
+        """Unfixed cell with the lowest candidates / weight, or None once all are fixed."""
+        best = None
+        best_count = self.N + 1
+        best_weight = 1
+        weight = self.weight
+        for cell, m in enumerate(self.cand):
+            if m & (m - 1):
+                count = m.bit_count()
+                if count * best_weight < best_count * weight[cell]:
+                    best = cell
+                    best_count = count
+                    best_weight = weight[cell]
+        return best
+
+    def solve(self) -> Tuple[str, List[int] | None]:
+        stats = self.stats
+        propagate = self._propagate
+        pick = self._pick
+        if stats.timed:
+            propagate = stats.timer(propagate, "propagate")
+            pick = stats.timer(pick, "branch")
+        if not self.ok or not propagate(self._queue):
+            return "UNSAT", None
+
+        # One frame per decision: [cell, values not tried yet, trail mark]
+        stack = []
+        while True:
+            cell = pick()
+            if cell is None:
+                return "SAT", self._model()
+            stack.append([cell, self.cand[cell], len(self.trail)])
+            if len(stack) > stats.max_depth:
+                stats.max_depth = len(stack)
+
+            while True:
+                frame = stack[-1]
+                cell, left, mark = frame
+                self._undo(mark)
+                if not left:
+                    stack.pop()
+                    if not stack:
+                        return "UNSAT", None
+                    if stats.on_backtrack is not None:
+                        stats.on_backtrack(len(stack))
+                    continue
+                bit = left & -left
+                frame[1] = left ^ bit
+                stats.decisions += 1
+                self.trail.append((cell, self.cand[cell]))
+                self.cand[cell] = bit
+                if stats.on_decision is not None:
+                    stats.on_decision(cell * self.N + bit.bit_length(), len(stack))
+                if propagate([cell]):
+                    break
+                stats.conflicts += 1
+                if stats.on_conflict is not None:
+                    stats.on_conflict(None, len(stack))
+
+    def _model(self):
+        """Every variable as a DIMACS literal, in the var(r,c,v) numbering."""
+        N = self.N
+        model = []
+        for cell, m in enumerate(self.cand):
+            chosen = m.bit_length()
+            model.extend(cell * N + v if v == chosen else -(cell * N + v) for v in range(1, N + 1))
+        model.sort()
+        return model
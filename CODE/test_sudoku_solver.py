@@ -0,0 +1,33 @@
+"""
+Cross-check of the direct solver against to_cnf + solve_cnf, including grid
+sizes that are not perfect squares (where the boxes only cover part of the
+grid). Run with python -m pytest.
+"""
+
+import random
+
+from encoder import puzzle_cnf
+from solver import solve_cnf
+from sudoku_solver import solve_sudoku
+
+
+def _puzzles():
+    for N in range(1, 10):
+        yield [[0] * N for _ in range(N)]
+    rnd = random.Random(13)
+    for N in (4, 5, 6, 7, 8):
+        for _ in range(4):
+            puzzle = [[0] * N for _ in range(N)]
+            for _ in range(N // 2):
+                puzzle[rnd.randrange(N)][rnd.randrange(N)] = rnd.randint(1, N)
+            yield puzzle
+
+
+def test_native_matches_cnf():
+    for puzzle in _puzzles():
+        clauses, num_vars = puzzle_cnf(puzzle)
+        status, model = solve_sudoku(puzzle)
+        assert status == solve_cnf(clauses, num_vars, "cdcl")[0], puzzle
+        if model is not None:
+            true = set(model)
+            assert all(any(lit in true for lit in clause) for clause in clauses), puzzle